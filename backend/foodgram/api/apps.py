@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.core.management import call_command
+from django.db.models.signals import post_migrate
+
+
+def create_cache_table(using, **kwargs):
+    """Таблица для кэша в базе данных, если он настроен (см. CACHES)."""
+    call_command('createcachetable', database=using, verbosity=0)
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        import api.signals  # noqa: F401
+        post_migrate.connect(create_cache_table, sender=self)
@@ -0,0 +1,238 @@
+"""
+Асинхронные версии самых нагруженных читающих эндпоинтов.
+Работают на асинхронном ORM Django и отдают те же данные, что и
+вьюсеты DRF, но не занимают поток на время запросов к базе данных.
+Рассчитаны на запуск под ASGI-сервером, см. foodgram/asgi.py.
+
+С вьюсетами общие аутентификация (DEFAULT_AUTHENTICATION_CLASSES),
+обработчик ошибок DRF, паджинация (RecipePagination и ApiPagination, в
+том числе cursor и count) и кэш ответов для анонимов. Отличия: только
+GET и только JSON, без browsable API и параметра format.
+"""
+from functools import wraps
+from http import HTTPStatus
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.http import HttpResponse, HttpResponseNotModified
+from django_filters.utils import translate_validation
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from api.caching import (RECIPES_VERSION_KEY, catalog_etag, etag_matches,
+                         patch_catalog_headers, recipe_version_key,
+                         recipes_cache_key)
+from api.feed import (abuild_recipes, absolute_url, feed_queryset,
+                      recipe_rows, represent_image_variants)
+from api.filters import RecipeFilter
+from api.paginations import ApiPagination, RecipePagination
+from api.renderers import FastJSONRenderer
+from api.search import ingredient_index
+from core.constants import CATALOG_CACHE_TIMEOUT, RECIPES_CACHE_TIMEOUT
+from recipes.models import Ingredients, Recipes, Tags
+from users.models import Follow
+
+renderer = FastJSONRenderer()
+
+
+def json_response(data, status=200):
+    return HttpResponse(renderer.render(data), status=status,
+                        content_type=renderer.media_type)
+
+
+def authenticate(request):
+    """
+    Аутентифицирует запрос DRF теми же классами, что и вьюсеты. Они
+    синхронные и обращаются к базе, поэтому вызываются в потоке.
+    """
+    return request.user
+
+
+def error_response(request, exc):
+    """Ответ на исключение DRF, как в APIView.handle_exception."""
+    if isinstance(exc, (exceptions.NotAuthenticated,
+                        exceptions.AuthenticationFailed)):
+        if request.authenticators:
+            exc.auth_header = request.authenticators[0].authenticate_header(
+                request)
+        else:
+            exc.status_code = HTTPStatus.FORBIDDEN
+    response = exception_handler(exc, {'request': request})
+    result = json_response(response.data, response.status_code)
+    if response.has_header('WWW-Authenticate'):
+        result['WWW-Authenticate'] = response['WWW-Authenticate']
+    return result
+
+
+def async_endpoint(login_required=False):
+    """
+    Оборачивает асинхронную функцию, возвращающую данные ответа:
+    передаёт ей запрос DRF, аутентифицирует его, разрешает только GET и
+    превращает исключения DRF в ответы того же вида, что и у вьюсетов.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            request = Request(request, authenticators=[
+                authentication() for authentication
+                in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+            try:
+                if request.method != 'GET':
+                    raise exceptions.MethodNotAllowed(request.method)
+                await sync_to_async(authenticate)(request)
+                if login_required and request.user.is_anonymous:
+                    raise exceptions.NotAuthenticated()
+                data = await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return error_response(request, exc)
+            return json_response(data)
+        return wrapper
+    return decorator
+
+
+def anonymous_cache(version_keys):
+    """
+    Кэш ответов для анонимов, как у RecipeCacheMixin. version_keys
+    получает аргументы из URL и возвращает ключи версий данных ответа.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if not request.user.is_anonymous:
+                return await view(request, *args, **kwargs)
+            key = await sync_to_async(recipes_cache_key)(
+                request, renderer.format, version_keys(**kwargs),
+                RecipePagination.cursor_query_param)
+            data = await cache.aget(key)
+            if data is None:
+                data = await view(request, *args, **kwargs)
+                await cache.aset(key, data, RECIPES_CACHE_TIMEOUT)
+            return data
+        return wrapper
+    return decorator
+
+
+def catalog_cache(view):
+    """
+    Кэш и ETag справочников, как у CatalogCacheMixin. В кэше хранится
+    готовое тело ответа.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return await view(request, *args, **kwargs)
+        etag = await sync_to_async(catalog_etag)(request, renderer.format)
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            key = f'catalog:response:{etag}'
+            content = await cache.aget(key)
+            if content is None:
+                response = await view(request, *args, **kwargs)
+                if response.status_code != HTTPStatus.OK:
+                    return response
+                await cache.aset(key, response.content,
+                                 CATALOG_CACHE_TIMEOUT)
+            else:
+                response = HttpResponse(content,
+                                        content_type=renderer.media_type)
+        patch_catalog_headers(response, etag)
+        return response
+    return wrapper
+
+
+def filter_recipes(request):
+    # Проверка фильтра по тегам обращается к базе синхронно.
+    filterset = RecipeFilter(request.GET, feed_queryset(request.user),
+                             request=request)
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+    return filterset.qs
+
+
+@async_endpoint()
+@anonymous_cache(lambda: (RECIPES_VERSION_KEY,))
+async def recipe_list(request):
+    queryset = await sync_to_async(filter_recipes)(request)
+    paginator = RecipePagination()
+    rows = await paginator.apaginate_queryset(recipe_rows(queryset), request)
+    return paginator.get_paginated_response(
+        await abuild_recipes(rows, request)).data
+
+
+@async_endpoint()
+@anonymous_cache(lambda pk: (recipe_version_key(pk),))
+async def recipe_detail(request, pk):
+    row = await recipe_rows(feed_queryset(request.user)).filter(
+        pk=pk).afirst()
+    if row is None:
+        raise exceptions.NotFound()
+    return (await abuild_recipes([row], request))[0]
+
+
+@catalog_cache
+@async_endpoint()
+async def tag_list(request):
+    return [tag async for tag in Tags.objects.order_by('id').values(
+        'id', 'name', 'color', 'slug')]
+
+
+@catalog_cache
+@async_endpoint()
+async def ingredient_list(request):
+    name = request.GET.get('name')
+    if name:
+        ingredients = await sync_to_async(ingredient_index.search)(name)
+        if ingredients is not None:
+            return ingredients
+    queryset = Ingredients.objects.values('id', 'name', 'measurement_unit')
+    if name:
+        queryset = queryset.filter(name__istartswith=name)
+    return [ingredient async for ingredient in queryset]
+
+
+def mini_recipe(row, request):
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'cooking_time': row['cooking_time'],
+        'image': absolute_url(request, row['image']) if row['image'] else None,
+        'images': represent_image_variants(row['image_variants'], request),
+    }
+
+
+@async_endpoint(login_required=True)
+async def subscriptions(request):
+    paginator = ApiPagination()
+    follows = await paginator.apaginate_queryset(Follow.objects.filter(
+        user=request.user
+    ).order_by('-id').values(
+        'author_id', 'author__email', 'author__username',
+        'author__first_name', 'author__last_name', 'author__recipes_count'),
+        request)
+    recipes = Recipes.objects.filter(
+        author_id__in=[follow['author_id'] for follow in follows])
+    limit = request.GET.get('recipes_limit')
+    if limit and limit.isdigit():
+        recipes = recipes.annotate(row_number=Window(
+            RowNumber(), partition_by=F('author'),
+            order_by=(F('pub_date').desc(), F('id').desc()),
+        )).filter(row_number__lte=int(limit))
+    by_author = {follow['author_id']: [] for follow in follows}
+    async for row in recipes.values('id', 'name', 'cooking_time', 'image',
+                                    'image_variants', 'author_id'):
+        by_author[row['author_id']].append(mini_recipe(row, request))
+    return paginator.get_paginated_response([{
+        'email': follow['author__email'],
+        'id': follow['author_id'],
+        'username': follow['author__username'],
+        'first_name': follow['author__first_name'],
+        'last_name': follow['author__last_name'],
+        'is_subscribed': True,
+        'recipes': by_author[follow['author_id']],
+        'recipes_count': follow['author__recipes_count'],
+    } for follow in follows]).data
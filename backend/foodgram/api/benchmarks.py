@@ -0,0 +1,398 @@
+"""
+Прогон эндпоинтов API на синтетическом наборе данных.
+Используется командой bench_api для контроля числа запросов к БД,
+времени ответа и размера ответа.
+"""
+import base64
+import io
+import json
+import random
+import statistics
+import time
+from dataclasses import dataclass, field
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.feed import build_recipes, recipe_rows
+from api.paginations import RecipePagination
+from api.renderers import FastJSONRenderer
+from api.serializers import RecipeListSerializer
+from api.services import calculate_shopping_lists, refresh_counters
+from core.constants import POSTS_ON_PAGE
+from recipes.models import (Favorites, Ingredients, IngredientsForRecipes,
+                            Recipes, ShoppingCart, ShoppingListItem, Tags)
+from recipes.popularity import refresh_popularity
+from users.models import Follow, User
+
+BENCH_PASSWORD = 'bench-password'
+INGREDIENTS_IN_RECIPE = 8
+
+
+@dataclass
+class Endpoint:
+    """Описание вызова эндпоинта и его бюджета."""
+    name: str
+    method: str
+    path: str
+    max_queries: int
+    max_ms: float = 250
+    status: int = 200
+    user: str = 'main'
+    data: dict = None
+    write: bool = False
+
+
+@dataclass
+class Result:
+    """Результат прогона одного эндпоинта."""
+    endpoint: Endpoint
+    status: int = 0
+    queries: int = 0
+    ms: float = 0
+    size: int = 0
+    errors: list = field(default_factory=list)
+
+
+def tiny_image():
+    """PNG-картинка в base64 для создания рецептов."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), '#FF0000').save(buffer, format='PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+def load_fixture(name):
+    with open(settings.BASE_DIR / name, encoding='utf-8') as fixture:
+        return [item['fields'] for item in json.load(fixture)]
+
+
+def seed(users=300, recipes=3000, follows=20, favorites=30, carts=10,
+         seed_value=42):
+    """
+    Наполняет базу данными: пользователи, рецепты с тегами и
+    ингредиентами, подписки, избранное и корзины.
+    """
+    rnd = random.Random(seed_value)
+    tags = Tags.objects.bulk_create(
+        Tags(**fields) for fields in load_fixture('tags.json'))
+    ingredients = Ingredients.objects.bulk_create(
+        Ingredients(**fields) for fields in load_fixture('ingr.json'))
+    password = make_password(BENCH_PASSWORD)
+    User.objects.bulk_create(
+        User(username=f'user{number}', email=f'user{number}@bench.local',
+             first_name=f'Имя{number}', last_name=f'Фамилия{number}',
+             password=password)
+        for number in range(users))
+    authors = list(User.objects.order_by('id'))
+    Recipes.objects.bulk_create(
+        Recipes(author=rnd.choice(authors), name=f'Рецепт {number}',
+                text=f'Описание рецепта {number}. ' * 10,
+                cooking_time=rnd.randint(5, 180),
+                image='media/bench.png')
+        for number in range(recipes))
+    recipe_ids = list(Recipes.objects.values_list('id', flat=True))
+    recipe_tags = Recipes.tags.through
+    recipe_tags.objects.bulk_create(
+        recipe_tags(recipes_id=recipe_id, tags_id=tag.id)
+        for recipe_id in recipe_ids
+        for tag in rnd.sample(tags, rnd.randint(1, len(tags))))
+    IngredientsForRecipes.objects.bulk_create(
+        (IngredientsForRecipes(recipe_id=recipe_id, ingredient=ingredient,
+                               amount=rnd.randint(1, 500))
+         for recipe_id in recipe_ids
+         for ingredient in rnd.sample(ingredients, INGREDIENTS_IN_RECIPE)),
+        batch_size=5000)
+    relations = {Follow: [], Favorites: [], ShoppingCart: []}
+    # На маленьких наборах у каждого пользователя остаются неподписанные
+    # авторы и рецепты вне избранного и корзины: они нужны эндпоинтам.
+    follows = min(follows, len(authors) - 2)
+    favorites = min(favorites, len(recipe_ids) // 2)
+    carts = min(carts, len(recipe_ids) // 4)
+    for user in authors:
+        others = [author for author in authors if author != user]
+        relations[Follow].extend(
+            Follow(user=user, author=author)
+            for author in rnd.sample(others, max(follows, 0)))
+        relations[Favorites].extend(
+            Favorites(author=user, recipe_id=recipe_id)
+            for recipe_id in rnd.sample(recipe_ids, favorites))
+        relations[ShoppingCart].extend(
+            ShoppingCart(author=user, recipe_id=recipe_id)
+            for recipe_id in rnd.sample(recipe_ids, carts))
+    for model, objs in relations.items():
+        model.objects.bulk_create(objs, batch_size=5000)
+    ShoppingListItem.objects.bulk_create(
+        (ShoppingListItem(author_id=author, ingredient_id=ingredient,
+                          amount=amount)
+         for (author, ingredient), amount in calculate_shopping_lists(
+             [user.id for user in authors]).items()),
+        batch_size=5000)
+    refresh_counters(Recipes.objects.all())
+    refresh_counters(User.objects.all())
+    refresh_popularity(full=True)
+    main, other = authors[0], authors[1]
+    deep = Recipes.objects.all()[recipes * 3 // 5]
+    return {
+        'users': {'main': main, 'other': other, 'anon': None},
+        'recipe': Recipes.objects.exclude(
+            favorite__author=main).exclude(
+            shopping_cart__author=main).first().id,
+        'own_recipe': Recipes.objects.create(
+            author=main, name='Рецепт для правки', text='-',
+            cooking_time=1, image='media/bench.png').id,
+        'doomed_recipe': Recipes.objects.create(
+            author=main, name='Удаляемый рецепт', text='-',
+            cooking_time=1, image='media/bench.png').id,
+        'author': User.objects.exclude(followed__user=main).exclude(
+            id=main.id).first().id,
+        'tag': tags[0].slug,
+        'tags': '&'.join(f'tags={tag.slug}' for tag in tags[:2]),
+        'tag_ids': [tag.id for tag in tags[:2]],
+        'ingredient': ingredients[0].id,
+        'ingredient_ids': [item.id for item in ingredients[:30]],
+        'prefix': ingredients[0].name[:2],
+        'search': deep.name,
+        'deep_page': recipes * 3 // 5 // POSTS_ON_PAGE + 1,
+        'deep_cursor': RecipePagination.make_cursor(
+            'n', deep.pub_date, deep.pk),
+    }
+
+
+def recipe_payload(context, name):
+    return {
+        'ingredients': [{'id': pk, 'amount': 10}
+                        for pk in context['ingredient_ids']],
+        'tags': context['tag_ids'],
+        'image': tiny_image(),
+        'name': name,
+        'text': 'Рецепт из бенчмарка',
+        'cooking_time': 15,
+    }
+
+
+def endpoints(context):
+    """Список вызовов в порядке выполнения."""
+    return [
+        Endpoint('tags-list', 'get', '/api/tags/', 2, user='anon'),
+        Endpoint('tags-detail', 'get', '/api/tags/1/', 2, user='anon'),
+        Endpoint('ingredients-search', 'get',
+                 f'/api/ingredients/?name={context["prefix"]}', 1,
+                 user='anon'),
+        Endpoint('ingredients-detail', 'get',
+                 f'/api/ingredients/{context["ingredient"]}/', 2,
+                 user='anon'),
+        Endpoint('recipes-list-anon', 'get', '/api/recipes/', 4,
+                 user='anon'),
+        Endpoint('recipes-detail-anon', 'get',
+                 f'/api/recipes/{context["recipe"]}/', 3, user='anon'),
+        Endpoint('async-recipes-list-anon', 'get', '/api/async/recipes/', 4,
+                 user='anon'),
+        Endpoint('async-recipes-detail-anon', 'get',
+                 f'/api/async/recipes/{context["recipe"]}/', 3, user='anon'),
+        Endpoint('async-tags-list', 'get', '/api/async/tags/', 1,
+                 user='anon'),
+        Endpoint('async-ingredients-search', 'get',
+                 f'/api/async/ingredients/?name={context["prefix"]}', 1,
+                 user='anon'),
+        Endpoint('recipes-list', 'get', '/api/recipes/', 4),
+        Endpoint('recipes-list-limit-100', 'get', '/api/recipes/?limit=100',
+                 4, max_ms=500),
+        Endpoint('recipes-list-deep-page', 'get',
+                 f'/api/recipes/?page={context["deep_page"]}&limit=6', 4),
+        Endpoint('recipes-list-cursor', 'get', '/api/recipes/?cursor=', 3),
+        Endpoint('recipes-list-deep-cursor', 'get',
+                 f'/api/recipes/?cursor={context["deep_cursor"]}&limit=6', 3),
+        Endpoint('recipes-ordering-popular', 'get',
+                 '/api/recipes/?ordering=popular', 4),
+        Endpoint('recipes-filter-tags', 'get',
+                 f'/api/recipes/?{context["tags"]}', 5),
+        Endpoint('recipes-filter-tags-all', 'get',
+                 f'/api/recipes/?{context["tags"]}&tags_match=all', 5),
+        Endpoint('recipes-by-ingredients', 'get',
+                 '/api/recipes/by_ingredients/?' + '&'.join(
+                     f'ingredients={pk}'
+                     for pk in context['ingredient_ids'][:20]), 4),
+        Endpoint('recipes-search', 'get',
+                 f'/api/recipes/?search={quote(context["search"])}', 4),
+        # Курсор идёт по дате, а поиск сортирует по релевантности: такой
+        # запрос паджинируется постранично.
+        Endpoint('recipes-search-cursor', 'get',
+                 f'/api/recipes/?search={quote(context["search"])}&cursor=',
+                 4),
+        Endpoint('recipes-filter-author', 'get',
+                 f'/api/recipes/?author={context["users"]["other"].id}', 5),
+        Endpoint('recipes-filter-favorited', 'get',
+                 '/api/recipes/?is_favorited=1', 4),
+        Endpoint('recipes-filter-shopping-cart', 'get',
+                 '/api/recipes/?is_in_shopping_cart=1', 4),
+        Endpoint('recipes-detail', 'get',
+                 f'/api/recipes/{context["recipe"]}/', 3),
+        Endpoint('recipes-download-shopping-cart', 'get',
+                 '/api/recipes/download_shopping_cart/', 3),
+        *(Endpoint(f'recipes-download-shopping-cart-{file_format}', 'get',
+                   '/api/recipes/download_shopping_cart/'
+                   f'?format={file_format}', 3)
+          for file_format in ('csv', 'json', 'pdf')),
+        Endpoint('users-list', 'get', '/api/users/', 3, user='anon'),
+        Endpoint('users-detail', 'get',
+                 f'/api/users/{context["author"]}/', 2, user='anon'),
+        Endpoint('users-me', 'get', '/api/users/me/', 1),
+        Endpoint('users-subscriptions', 'get',
+                 '/api/users/subscriptions/?recipes_limit=3', 4),
+        Endpoint('users-subscriptions-limit-50', 'get',
+                 '/api/users/subscriptions/?limit=50&recipes_limit=3', 4),
+        Endpoint('recipes-create', 'post', '/api/recipes/', 15,
+                 status=201, data=recipe_payload(context, 'Новый рецепт'),
+                 write=True),
+        Endpoint('recipes-update', 'patch',
+                 f'/api/recipes/{context["own_recipe"]}/', 19,
+                 data=recipe_payload(context, 'Обновлённый рецепт'),
+                 write=True),
+        Endpoint('recipes-favorite', 'post',
+                 f'/api/recipes/{context["recipe"]}/favorite/', 6,
+                 status=201, write=True),
+        Endpoint('recipes-favorite-delete', 'delete',
+                 f'/api/recipes/{context["recipe"]}/favorite/', 7,
+                 status=204, write=True),
+        # Список покупок: новые ингредиенты вставляются, уже купленные
+        # обновляются, число запросов зависит от данных.
+        Endpoint('recipes-shopping-cart', 'post',
+                 f'/api/recipes/{context["recipe"]}/shopping_cart/', 12,
+                 status=201, write=True),
+        Endpoint('recipes-shopping-cart-delete', 'delete',
+                 f'/api/recipes/{context["recipe"]}/shopping_cart/', 13,
+                 status=204, write=True),
+        Endpoint('recipes-delete', 'delete',
+                 f'/api/recipes/{context["doomed_recipe"]}/', 20,
+                 status=204, write=True),
+        Endpoint('users-subscribe', 'post',
+                 f'/api/users/{context["author"]}/subscribe/', 8,
+                 status=201, write=True),
+        Endpoint('users-subscribe-delete', 'delete',
+                 f'/api/users/{context["author"]}/subscribe/', 6,
+                 status=204, write=True),
+        Endpoint('users-create', 'post', '/api/users/', 3, status=201,
+                 user='anon', write=True,
+                 data={'email': 'new@bench.local', 'username': 'newbie',
+                       'first_name': 'Новый', 'last_name': 'Пользователь',
+                       'password': BENCH_PASSWORD}),
+        Endpoint('auth-token-login', 'post', '/api/auth/token/login/', 6,
+                 user='anon', write=True,
+                 data={'email': 'new@bench.local',
+                       'password': BENCH_PASSWORD}),
+        Endpoint('users-set-password', 'post', '/api/users/set_password/',
+                 2, status=204, user='other', write=True,
+                 data={'new_password': 'another-bench-password',
+                       'current_password': BENCH_PASSWORD}),
+        Endpoint('auth-token-logout', 'post', '/api/auth/token/logout/', 3,
+                 status=204, write=True),
+    ]
+
+
+@dataclass
+class FeedComparison:
+    """Сравнение сериализатора и быстрой сборки ленты."""
+    limit: int
+    serializer_ms: float
+    fast_ms: float
+    identical: bool
+
+    @property
+    def speedup(self):
+        return self.serializer_ms / self.fast_ms
+
+
+def compare_feed(context, repeat=5, limit=100):
+    """
+    Собирает одну страницу ленты сериализатором RecipeListSerializer с
+    JSONRenderer и быстрым путём с FastJSONRenderer, сравнивает время
+    и побайтное совпадение результата.
+    """
+    from api.views import RecipesViewSet
+
+    request = Request(APIRequestFactory().get('/api/recipes/'))
+    request.user = context['users']['main']
+    view = RecipesViewSet(request=request, format_kwarg=None, action='list')
+    queryset = view.get_queryset()
+
+    def serialized():
+        return JSONRenderer().render(RecipeListSerializer(
+            queryset.all()[:limit], many=True,
+            context={'request': request}).data)
+
+    def fast():
+        return FastJSONRenderer().render(
+            build_recipes(list(recipe_rows(queryset)[:limit]), request))
+
+    timings = {}
+    for name, build in (('serializer', serialized), ('fast', fast)):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            timings[name + '_bytes'] = build()
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[name] = statistics.median(samples)
+    return FeedComparison(
+        limit, timings['serializer'], timings['fast'],
+        timings['serializer_bytes'] == timings['fast_bytes'])
+
+
+def response_size(response):
+    if response.streaming:
+        return len(b''.join(response.streaming_content))
+    return len(response.content)
+
+
+def call(endpoint, client):
+    """Выполняет запрос и возвращает статус, число запросов, мс, байты."""
+    request = getattr(client, endpoint.method)
+    kwargs = {'format': 'json'} if endpoint.data is not None else {}
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = request(endpoint.path, endpoint.data, **kwargs)
+        size = response_size(response)
+        elapsed = (time.perf_counter() - start) * 1000
+    return response.status_code, len(queries), elapsed, size
+
+
+def run(context, repeat=5, check_latency=False):
+    """
+    Прогоняет все эндпоинты и проверяет бюджеты числа запросов, а с
+    check_latency и времени ответа: оно зависит от машины, поэтому по
+    умолчанию только выводится.
+    """
+    clients = {}
+    for name, user in context['users'].items():
+        clients[name] = APIClient()
+        if user is not None:
+            clients[name].force_authenticate(user)
+    results = []
+    for endpoint in endpoints(context):
+        result = Result(endpoint)
+        timings = []
+        for _ in range(1 if endpoint.write else repeat):
+            result.status, queries, elapsed, result.size = call(
+                endpoint, clients[endpoint.user])
+            result.queries = max(result.queries, queries)
+            timings.append(elapsed)
+        result.ms = statistics.median(timings)
+        if result.status != endpoint.status:
+            result.errors.append(
+                f'статус {result.status}, ожидался {endpoint.status}')
+        if result.queries > endpoint.max_queries:
+            result.errors.append(
+                f'{result.queries} запросов к БД, '
+                f'бюджет {endpoint.max_queries}')
+        if check_latency and result.ms > endpoint.max_ms:
+            result.errors.append(
+                f'{result.ms:.1f} мс, бюджет {endpoint.max_ms} мс')
+        results.append(result)
+    return results
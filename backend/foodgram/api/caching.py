@@ -0,0 +1,251 @@
+import time
+from hashlib import md5
+
+from django.core.cache import cache, caches
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.connection import ConnectionProxy
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from core.constants import (CACHE_VERSION_MAX_AGE, CACHE_VERSION_MAX_KEYS,
+                            CATALOG_CACHE_MAX_AGE, CATALOG_CACHE_TIMEOUT,
+                            RECIPE_INGREDIENT_CHANGES_ATTEMPTS,
+                            RECIPE_INGREDIENT_CHANGES_TIMEOUT,
+                            RECIPES_CACHE_TIMEOUT)
+
+CATALOG_VERSION_KEY = 'catalog:version'
+RECIPES_VERSION_KEY = 'recipes:version'
+AUTHORS_VERSION_KEY = 'authors:version'
+RECIPE_INGREDIENTS_VERSION_KEY = 'recipe_ingredients:version'
+
+# Версии живут в отдельном кэше без срока: их не вытесняют ответы.
+versions_cache = ConnectionProxy(caches, 'versions')
+
+
+# Версии, недавно прочитанные этим процессом: {ключ: (версия, время)}.
+# Их меняют и другие процессы, поэтому прочитанное значение живёт не
+# дольше CACHE_VERSION_MAX_AGE секунд, а свои изменения видны сразу.
+recent_versions = {}
+
+
+def remember_version(key, version):
+    if len(recent_versions) >= CACHE_VERSION_MAX_KEYS:
+        recent_versions.clear()
+    recent_versions[key] = (version, time.monotonic())
+    return version
+
+
+def recent_version(key):
+    version, read_at = recent_versions.get(key, (None, None))
+    if read_at is not None and (
+            time.monotonic() - read_at < CACHE_VERSION_MAX_AGE):
+        return version
+    return None
+
+
+def get_version(key):
+    """
+    Текущая версия данных. Начальное значение берётся из времени, чтобы
+    после очистки кэша версии не совпали с уже выданными ETag.
+    """
+    version = recent_version(key)
+    if version is not None:
+        return version
+    version = versions_cache.get(key)
+    if version is None:
+        versions_cache.add(key, time.time_ns(), timeout=None)
+        version = versions_cache.get(key)
+    return remember_version(key, version)
+
+
+def bump_version(key):
+    """Увеличивает версию и возвращает её, None — если ключа не было."""
+    try:
+        return remember_version(key, versions_cache.incr(key))
+    except ValueError:
+        versions_cache.add(key, time.time_ns(), timeout=None)
+        recent_versions.pop(key, None)
+
+
+def get_versions(*keys):
+    """Версии нескольких ключей за одно обращение к кэшу."""
+    versions = {key: recent_version(key) for key in keys}
+    missing = [key for key, version in versions.items() if version is None]
+    if missing:
+        for key, version in versions_cache.get_many(missing).items():
+            versions[key] = remember_version(key, version)
+    for key in keys:
+        if versions[key] is None:
+            versions[key] = get_version(key)
+    return [versions[key] for key in keys]
+
+
+def recipe_version_key(pk):
+    return f'recipes:version:{pk}'
+
+
+def bump_recipe_lists_version():
+    """Сбрасывает кэш списков рецептов."""
+    bump_version(RECIPES_VERSION_KEY)
+
+
+def bump_recipe_version(pk):
+    """Сбрасывает кэш списков рецептов и детальной страницы рецепта."""
+    bump_recipe_lists_version()
+    bump_version(recipe_version_key(pk))
+
+
+def recipe_ingredients_change_key(version):
+    return f'recipe_ingredients:change:{version}'
+
+
+def record_recipe_ingredients_change(pk):
+    """
+    Записывает в журнал изменений, что состав рецепта pk изменился.
+    Каждой версии соответствует один рецепт, по журналу индексы
+    в памяти процессов обновляют только изменённые рецепты.
+    """
+    # incr общего кэша (в базе, в файлах) не атомарен: два процесса могут
+    # получить одну версию, тогда второй берёт следующую.
+    for _ in range(RECIPE_INGREDIENT_CHANGES_ATTEMPTS):
+        version = bump_version(RECIPE_INGREDIENTS_VERSION_KEY)
+        if version is None or cache.add(
+                recipe_ingredients_change_key(version), pk,
+                RECIPE_INGREDIENT_CHANGES_TIMEOUT):
+            return
+
+
+def recipe_composition_changed(pk):
+    """Состав рецепта pk изменён в обход сохранения самого рецепта."""
+    bump_recipe_version(pk)
+    record_recipe_ingredients_change(pk)
+
+
+def bump_authors_version():
+    bump_version(AUTHORS_VERSION_KEY)
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def plain_data(data):
+    """Данные ответа без ссылок на сериализатор, пригодные для кэша."""
+    if isinstance(data, ReturnList):
+        return list(data)
+    if isinstance(data, ReturnDict):
+        return dict(data)
+    if isinstance(data, dict):
+        return {key: plain_data(value) for key, value in data.items()}
+    return data
+
+
+def catalog_etag(request, response_format):
+    """ETag ответа справочника: меняется вместе с версией каталога."""
+    return quote_etag(md5(
+        f'{get_catalog_version()}:{response_format}:'
+        f'{request.get_full_path()}'.encode()).hexdigest())
+
+
+def etag_matches(request, etag):
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    return etag in etags or '*' in etags
+
+
+def patch_catalog_headers(response, etag):
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=CATALOG_CACHE_MAX_AGE)
+    patch_vary_headers(response, ('Accept',))
+
+
+class CatalogCacheMixin:
+    """
+    Кэширует ответы справочников по версии каталога и отдаёт их с ETag,
+    повторный запрос с If-None-Match получает 304 Not Modified.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request,
+                                        *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request,
+                                        *args, **kwargs)
+
+    def get_cached_response(self, view, request, *args, **kwargs):
+        etag = catalog_etag(request, request.accepted_renderer.format)
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            key = f'catalog:response:{etag}'
+            data = cache.get(key)
+            if data is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, plain_data(response.data),
+                          CATALOG_CACHE_TIMEOUT)
+            else:
+                response = Response(data)
+        patch_catalog_headers(response, etag)
+        return response
+
+
+def recipes_cache_key(request, response_format, version_keys, cursor=None):
+    """
+    Ключ кэша ответа о рецептах для анонимов: нормализованные параметры
+    запроса и версии данных, от которых зависит ответ.
+    """
+    versions = get_versions(CATALOG_VERSION_KEY, AUTHORS_VERSION_KEY,
+                            *version_keys)
+    # Пустой cursor включает курсорную паджинацию, его не отбрасываем.
+    query = sorted(
+        (name, sorted(values))
+        for name, values in request.query_params.lists()
+        if any(values) or name == cursor)
+    return 'recipes:response:' + md5(
+        f'{versions}:{response_format}:'
+        f'{request.get_host()}:{request.path}:{query}'.encode()
+    ).hexdigest()
+
+
+class RecipeCacheMixin:
+    """
+    Кэширует списки и страницы рецептов для анонимных пользователей:
+    им отдаётся одинаковый ответ. Ключ строится по нормализованным
+    параметрам запроса и версиям данных, поэтому изменение рецепта
+    сбрасывает только списки и страницу этого рецепта.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, (RECIPES_VERSION_KEY,), request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, (recipe_version_key(kwargs.get('pk')),),
+            request, *args, **kwargs)
+
+    def get_cache_key(self, request, version_keys):
+        return recipes_cache_key(
+            request, request.accepted_renderer.format, version_keys,
+            getattr(self.paginator, 'cursor_query_param', None))
+
+    def get_cached_response(self, view, version_keys, request,
+                            *args, **kwargs):
+        if not request.user.is_anonymous:
+            return view(request, *args, **kwargs)
+        key = self.get_cache_key(request, version_keys)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, plain_data(response.data), RECIPES_CACHE_TIMEOUT)
+        return response
@@ -0,0 +1,148 @@
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from django.db.models import Exists, OuterRef, Value
+from rest_framework.response import Response
+
+from recipes.images import FORMATS
+from recipes.models import (Favorites, IngredientsForRecipes, Recipes,
+                            ShoppingCart)
+
+RECIPE_FIELDS = ('id', 'name', 'image', 'image_variants', 'text',
+                 'cooking_time', 'pub_date', 'is_favorited',
+                 'is_in_shopping_cart', 'author__id', 'author__username',
+                 'author__email', 'author__first_name', 'author__last_name')
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+
+
+def absolute_url(request, path):
+    url = default_storage.url(path)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def represent_image_variants(variants, request):
+    """
+    Ссылки на уменьшенные копии изображения по размерам и готовые
+    значения srcset для каждого формата.
+    """
+    images = {
+        name: {**variant, **{image_format: absolute_url(request,
+                                                        variant[image_format])
+                             for image_format in FORMATS}}
+        for name, variant in variants.items()
+    }
+    if images:
+        images['srcset'] = {
+            image_format: ', '.join(
+                f'{image[image_format]} {image["width"]}w'
+                for image in images.values())
+            for image_format in FORMATS
+        }
+    return images
+
+
+def feed_queryset(user):
+    """Рецепты с автором и отметками избранного и списка покупок."""
+    queryset = Recipes.objects.select_related('author')
+    if user.is_anonymous:
+        return queryset.annotate(is_favorited=Value(False),
+                                 is_in_shopping_cart=Value(False))
+    return queryset.annotate(
+        is_favorited=Exists(Favorites.objects.filter(
+            author=user, recipe=OuterRef('pk'))),
+        is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+            author=user, recipe=OuterRef('pk'))))
+
+
+def recipe_rows(queryset):
+    """Строки ленты рецептов без создания моделей и префетчей."""
+    return queryset.prefetch_related(None).values(*RECIPE_FIELDS)
+
+
+def tag_rows(ids):
+    return Recipes.tags.through.objects.filter(
+        recipes_id__in=ids
+    ).order_by('tags_id').values_list(
+        'recipes_id', *(f'tags__{field}' for field in TAG_FIELDS))
+
+
+def ingredient_rows(ids):
+    return IngredientsForRecipes.objects.filter(
+        recipe_id__in=ids
+    ).order_by('id').values_list(
+        'recipe_id', *(f'ingredient__{field}' for field in INGREDIENT_FIELDS),
+        'amount')
+
+
+def group_tags(rows):
+    tags = defaultdict(list)
+    for row in rows:
+        tags[row[0]].append(dict(zip(TAG_FIELDS, row[1:])))
+    return tags
+
+
+def group_ingredients(rows):
+    ingredients = defaultdict(list)
+    for row in rows:
+        ingredients[row[0]].append({**dict(zip(INGREDIENT_FIELDS, row[1:4])),
+                                    'amount': row[4]})
+    return ingredients
+
+
+def assemble_recipes(rows, tags, ingredients, request):
+    return [{
+        'id': row['id'],
+        'tags': tags[row['id']],
+        'author': {
+            'id': row['author__id'],
+            'username': row['author__username'],
+            'email': row['author__email'],
+            'first_name': row['author__first_name'],
+            'last_name': row['author__last_name'],
+        },
+        'ingredients': ingredients[row['id']],
+        'is_favorited': row['is_favorited'],
+        'is_in_shopping_cart': row['is_in_shopping_cart'],
+        'name': row['name'],
+        'image': absolute_url(request, row['image']) if row['image'] else None,
+        'images': represent_image_variants(row['image_variants'], request),
+        'text': row['text'],
+        'cooking_time': row['cooking_time'],
+    } for row in rows]
+
+
+def build_recipes(rows, request):
+    """
+    Собирает ленту рецептов из строк recipe_rows в том же виде, что и
+    RecipeListSerializer: теги и ингредиенты всей страницы загружаются
+    двумя запросами и раскладываются по рецептам в Python.
+    """
+    ids = [row['id'] for row in rows]
+    return assemble_recipes(rows, group_tags(tag_rows(ids)),
+                            group_ingredients(ingredient_rows(ids)), request)
+
+
+async def abuild_recipes(rows, request):
+    """Асинхронный вариант build_recipes."""
+    ids = [row['id'] for row in rows]
+    tags = group_tags([row async for row in tag_rows(ids)])
+    ingredients = group_ingredients(
+        [row async for row in ingredient_rows(ids)])
+    return assemble_recipes(rows, tags, ingredients, request)
+
+
+class RecipeFeedMixin:
+    """
+    Отдаёт список рецептов без сериализаторов: строки .values()
+    собираются в словари того же вида, что и у RecipeListSerializer.
+    """
+
+    def list(self, request, *args, **kwargs):
+        rows = recipe_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(build_recipes(list(rows), request))
+        return self.get_paginated_response(build_recipes(page, request))
@@ -1,7 +1,16 @@
+from django.db.models import Exists, F, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
 from recipes.models import Recipes, Tags
+from recipes.search import search_recipes
+
+TAGS_MATCH_ANY = 'any'
+TAGS_MATCH_ALL = 'all'
+TAGS_MATCH_CHOICES = ((TAGS_MATCH_ANY, 'Любой из тегов'),
+                      (TAGS_MATCH_ALL, 'Все теги'))
+ORDERING_POPULAR = 'popular'
+ORDERING_CHOICES = ((ORDERING_POPULAR, 'Сначала популярные'),)
 
 
 class IngredientFilter(SearchFilter):
@@ -15,24 +24,68 @@ class RecipeFilter(FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tags.objects.all(),
+        method='filter_tags',
     )
+    tags_match = filters.ChoiceFilter(choices=TAGS_MATCH_CHOICES,
+                                      method='filter_tags_match')
     is_in_shopping_cart = filters.NumberFilter(
         method='filter_is_in_shopping_cart')
     is_favorited = filters.NumberFilter(
         method='filter_is_favorited')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(choices=ORDERING_CHOICES,
+                                    method='filter_ordering')
 
     class Meta:
         model = Recipes
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'tags_match', 'author', 'is_favorited',
+                  'is_in_shopping_cart', 'search', 'ordering')
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Рецепты с любым (tags_match=any) или со всеми (tags_match=all)
+        указанными тегами. Подзапросы EXISTS к таблице связи идут по её
+        уникальному индексу (рецепт, тег) и не размножают строки рецептов.
+        """
+        if not value:
+            return queryset
+        tag_ids = sorted({tag.id for tag in value})
+        links = Recipes.tags.through.objects.filter(recipes=OuterRef('pk'))
+        if self.form.cleaned_data.get('tags_match') == TAGS_MATCH_ALL:
+            for tag_id in tag_ids:
+                queryset = queryset.filter(Exists(links.filter(tags=tag_id)))
+            return queryset
+        return queryset.filter(Exists(links.filter(tags__in=tag_ids)))
+
+    def filter_tags_match(self, queryset, name, value):
+        # Режим учитывается в filter_tags.
+        return queryset
 
     def filter_is_favorited(self, queryset, name, value):
         if value:
-            return queryset.filter(
-                favorite__author=self.request.user.id)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value:
-            return queryset.filter(
-                shopping_cart__author=self.request.user.id)
+            return queryset.filter(is_in_shopping_cart=True)
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию, сначала релевантные."""
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value).order_by(
+            '-search_rank', '-pub_date', '-id')
+
+    def filter_ordering(self, queryset, name, value):
+        """
+        Сортировка по заранее посчитанной популярности, без агрегации
+        избранного и покупок. Рецепты, ещё не попавшие в пересчёт, идут
+        в конце, новые раньше.
+        """
+        if value == ORDERING_POPULAR:
+            return queryset.order_by(
+                F('popularity__score').desc(nulls_last=True), '-pub_date',
+                '-id')
         return queryset
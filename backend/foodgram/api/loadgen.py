@@ -0,0 +1,165 @@
+"""
+Генератор HTTP-нагрузки на asyncio без сторонних зависимостей.
+Держит сотни одновременных клиентов в одном процессе: каждый клиент
+работает через своё keep-alive соединение и переподключается, если
+сервер его закрыл.
+"""
+import asyncio
+import math
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+MAX_LINE = 64 * 1024
+
+
+class HTTPError(Exception):
+    """Сервер прислал некорректный ответ или закрыл соединение."""
+
+
+class Connection:
+    """Одно HTTP/1.1 соединение с сервером."""
+
+    def __init__(self, base_url, timeout=30):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.host_header = url.netloc
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.port, limit=MAX_LINE)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers=None, body=b''):
+        """Возвращает статус, заголовки и тело ответа."""
+        for attempt in range(2):
+            if self.writer is None:
+                await self.connect()
+            try:
+                return await asyncio.wait_for(
+                    self.exchange(method, path, headers or {}, body),
+                    self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError,
+                    HTTPError):
+                # Сервер мог закрыть простаивавшее соединение.
+                self.close()
+                if attempt:
+                    raise
+            except asyncio.TimeoutError:
+                self.close()
+                raise
+
+    async def exchange(self, method, path, headers, body):
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host_header}',
+                 'Connection: keep-alive', f'Content-Length: {len(body)}']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        self.writer.write(
+            ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise HTTPError('Соединение закрыто сервером.')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        content = await self.read_body(response_headers)
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, response_headers, content
+
+    async def read_body(self, headers):
+        if 'content-length' in headers:
+            return await self.reader.readexactly(
+                int(headers['content-length']))
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if not size:
+                    await self.reader.readline()
+                    return b''.join(chunks)
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+        content = await self.reader.read()
+        self.close()
+        return content
+
+
+def percentile(values, fraction):
+    """Перцентиль по методу ближайшего ранга, values отсортированы."""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+@dataclass
+class LoadStats:
+    """Время ответов и ошибки одной серии запросов."""
+    name: str
+    clients: int = 0
+    elapsed: float = 0.0
+    latencies: list = field(default_factory=list)
+    errors: int = 0
+
+    def add(self, latency, ok):
+        self.latencies.append(latency)
+        if not ok:
+            self.errors += 1
+
+    @property
+    def requests(self):
+        return len(self.latencies)
+
+    @property
+    def rps(self):
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def ms(self, fraction):
+        return percentile(sorted(self.latencies), fraction) * 1000
+
+
+async def run_clients(client, clients, duration):
+    """
+    Запускает clients копий корутины client(deadline) и ждёт, пока все
+    они закончат работу после наступления deadline.
+    """
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(client(deadline) for _ in range(clients)))
+
+
+async def hammer(base_url, path, clients, duration, headers=None,
+                 name=None):
+    """Нагружает один адрес: clients клиентов шлют GET без пауз."""
+    stats = LoadStats(name or path, clients)
+
+    async def client(deadline):
+        connection = Connection(base_url)
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    status, _, _ = await connection.request(
+                        'GET', path, headers)
+                except (OSError, asyncio.TimeoutError, HTTPError,
+                        asyncio.IncompleteReadError):
+                    status = None
+                stats.add(time.perf_counter() - start, status == 200)
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    await run_clients(client, clients, duration)
+    stats.elapsed = time.perf_counter() - start
+    return stats
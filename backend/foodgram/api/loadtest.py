@@ -0,0 +1,213 @@
+"""
+Нагрузочный тест по сценариям пользователей. Виртуальные пользователи
+регистрируются и получают токены через API, затем до конца теста
+случайно выбирают сценарии: лента, фильтр по тегам, рецепт, избранное,
+список покупок, автодополнение ингредиентов, подписки.
+"""
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+from urllib.parse import quote
+
+from api.loadgen import Connection, HTTPError, LoadStats
+
+LOADTEST_EMAIL = 'loadtest{}@loadtest.local'
+# Буквы, с которых начинаются названия ингредиентов для автодополнения.
+INGREDIENT_LETTERS = 'абвгкмпрсчя'
+
+
+class LoadTestError(Exception):
+    """Не удалось подготовить пользователей или данные для теста."""
+
+
+@dataclass
+class Step:
+    """Один запрос сценария и допустимые статусы ответа."""
+    name: str
+    method: str
+    path: str
+    data: dict = None
+    expect: tuple = (200,)
+
+
+def browse_feed(catalog, rng):
+    yield Step('recipes-list', 'GET', '/api/recipes/')
+    for page in range(2, rng.randint(2, 4) + 1):
+        yield Step('recipes-list-page', 'GET', f'/api/recipes/?page={page}')
+
+
+def filter_by_tags(catalog, rng):
+    tags = rng.sample(catalog['tags'], min(2, len(catalog['tags'])))
+    yield Step('recipes-filter-tags', 'GET', '/api/recipes/?' + '&'.join(
+        f'tags={tag}' for tag in tags))
+
+
+def open_recipe(catalog, rng):
+    yield Step('recipes-detail', 'GET',
+               f'/api/recipes/{rng.choice(catalog["recipes"])}/')
+
+
+def favorite(catalog, rng):
+    path = f'/api/recipes/{rng.choice(catalog["recipes"])}/favorite/'
+    yield Step('recipes-favorite', 'POST', path, expect=(201,))
+    yield Step('recipes-favorite-delete', 'DELETE', path, expect=(204,))
+
+
+def shopping_cart(catalog, rng):
+    path = f'/api/recipes/{rng.choice(catalog["recipes"])}/shopping_cart/'
+    yield Step('recipes-shopping-cart', 'POST', path, expect=(201,))
+    yield Step('recipes-download-shopping-cart', 'GET',
+               '/api/recipes/download_shopping_cart/')
+    yield Step('recipes-shopping-cart-delete', 'DELETE', path,
+               expect=(204,))
+
+
+def ingredient_autocomplete(catalog, rng):
+    name = rng.choice(catalog['ingredients'])
+    for length in range(1, min(len(name), 5) + 1):
+        yield Step('ingredients-search', 'GET',
+                   f'/api/ingredients/?name={quote(name[:length])}')
+
+
+def subscriptions(catalog, rng):
+    yield Step('users-subscriptions', 'GET',
+               '/api/users/subscriptions/?recipes_limit=3')
+    yield Step('users-subscriptions-page', 'GET',
+               '/api/users/subscriptions/?page=2&recipes_limit=3',
+               expect=(200, 404))
+
+
+# Сценарии и их веса: чтение ленты встречается чаще всего.
+JOURNEYS = (
+    (browse_feed, 30),
+    (filter_by_tags, 15),
+    (open_recipe, 25),
+    (favorite, 8),
+    (shopping_cart, 5),
+    (ingredient_autocomplete, 10),
+    (subscriptions, 7),
+)
+
+
+async def call(connection, step, token=None):
+    headers = {'Accept': 'application/json'}
+    body = b''
+    if token:
+        headers['Authorization'] = f'Token {token}'
+    if step.data is not None:
+        headers['Content-Type'] = 'application/json'
+        body = json.dumps(step.data).encode()
+    status, _, content = await connection.request(step.method, step.path,
+                                                  headers, body)
+    return status, content
+
+
+async def login(connection, number, password):
+    """Регистрирует пользователя, если его ещё нет, и получает токен."""
+    email = LOADTEST_EMAIL.format(number)
+    status, content = await call(connection, Step(
+        'users-create', 'POST', '/api/users/', {
+            'email': email, 'username': f'loadtest{number}',
+            'first_name': 'Нагрузка', 'last_name': f'Тест{number}',
+            'password': password}))
+    if status not in (201, 400):
+        raise LoadTestError(f'Регистрация {email}: {status} {content!r}')
+    status, content = await call(connection, Step(
+        'auth-token-login', 'POST', '/api/auth/token/login/',
+        {'email': email, 'password': password}))
+    if status != 200:
+        raise LoadTestError(f'Вход {email}: {status} {content!r}')
+    return json.loads(content)['auth_token']
+
+
+async def get_json(connection, path, token):
+    status, content = await call(connection, Step('setup', 'GET', path),
+                                 token)
+    if status != 200:
+        raise LoadTestError(f'{path}: {status} {content!r}')
+    return json.loads(content)
+
+
+async def prepare(base_url, users, password):
+    """Токены пользователей и данные для сценариев."""
+    connection = Connection(base_url)
+    try:
+        tokens = [await login(connection, number, password)
+                  for number in range(users)]
+        feed = await get_json(connection, '/api/recipes/?limit=100',
+                              tokens[0])
+        if not feed['results']:
+            raise LoadTestError('В базе нет рецептов.')
+        ingredients = set()
+        for letter in INGREDIENT_LETTERS:
+            ingredients.update(item['name'] for item in await get_json(
+                connection, f'/api/ingredients/?name={quote(letter)}',
+                tokens[0]))
+        catalog = {
+            'recipes': [recipe['id'] for recipe in feed['results']],
+            'authors': sorted({recipe['author']['id']
+                               for recipe in feed['results']}),
+            'tags': [tag['slug'] for tag in await get_json(
+                connection, '/api/tags/', tokens[0])],
+            'ingredients': sorted(ingredients) or ['а'],
+        }
+        for token in tokens:
+            for author in catalog['authors'][:10]:
+                # 400: подписка уже есть или это сам пользователь.
+                await call(connection, Step(
+                    'users-subscribe', 'POST',
+                    f'/api/users/{author}/subscribe/'), token)
+        return tokens, catalog
+    finally:
+        connection.close()
+
+
+async def virtual_user(base_url, token, catalog, stats, deadline, think,
+                       rng):
+    journeys, weights = zip(*JOURNEYS)
+    if not catalog['tags']:
+        weights = [0 if journey is filter_by_tags else weight
+                   for journey, weight in JOURNEYS]
+    connection = Connection(base_url)
+    try:
+        while time.perf_counter() < deadline:
+            journey = rng.choices(journeys, weights)[0]
+            # Сценарий доводится до конца, чтобы не оставлять за собой
+            # избранное и покупки, мешающие следующему запуску.
+            for step in journey(catalog, rng):
+                start = time.perf_counter()
+                try:
+                    status, _ = await call(connection, step, token)
+                except (OSError, asyncio.TimeoutError, HTTPError,
+                        asyncio.IncompleteReadError):
+                    status = None
+                stats.setdefault(step.name, LoadStats(step.name)).add(
+                    time.perf_counter() - start, status in step.expect)
+                if think:
+                    await asyncio.sleep(rng.expovariate(1 / think))
+    finally:
+        connection.close()
+
+
+async def run_loadtest(base_url, users=20, clients=20, duration=60,
+                       think=0.0, password='loadtest-password', seed=None):
+    """
+    Прогоняет сценарии clients виртуальными пользователями в течение
+    duration секунд. think — среднее время паузы между запросами.
+    Возвращает статистику по эндпоинтам и общую длительность.
+    """
+    tokens, catalog = await prepare(base_url, users, password)
+    rng = random.Random(seed)
+    stats = {}
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        virtual_user(base_url, tokens[number % len(tokens)], catalog, stats,
+                     deadline, think, random.Random(rng.random()))
+        for number in range(clients)))
+    elapsed = time.perf_counter() - start
+    for endpoint in stats.values():
+        endpoint.clients, endpoint.elapsed = clients, elapsed
+    return stats, elapsed
@@ -0,0 +1,84 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (override_settings, setup_databases,
+                               setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+
+from api.benchmarks import compare_feed, run, seed
+
+MIN_USERS = 3
+MIN_RECIPES = 10
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет тестовую базу данными и прогоняет все эндпоинты API, '
+        'проверяя число запросов к БД. Время ответа зависит от машины и '
+        'проверяется только с --check-latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=300)
+        parser.add_argument('--recipes', type=int, default=3000)
+        parser.add_argument('--check-latency', action='store_true',
+                            help='Проверять и бюджеты времени ответа.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Сколько раз вызывать читающие эндпоинты.')
+        parser.add_argument('--output',
+                            help='Сохранить результаты в JSON-файл.')
+
+    def handle(self, *args, **options):
+        if options['users'] < MIN_USERS or options['recipes'] < MIN_RECIPES:
+            raise CommandError(f'Нужно не меньше {MIN_USERS} пользователей '
+                               f'и {MIN_RECIPES} рецептов.')
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(
+                        MEDIA_ROOT=media_root,
+                        PASSWORD_HASHERS=[
+                            'django.contrib.auth.hashers.MD5PasswordHasher']):
+                context = seed(users=options['users'],
+                               recipes=options['recipes'])
+                results = run(context, repeat=options['repeat'],
+                              check_latency=options['check_latency'])
+                feed = compare_feed(context, repeat=options['repeat'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        self.report(results)
+        self.stdout.write(
+            f'лента limit={feed.limit}: сериализатор '
+            f'{feed.serializer_ms:.1f} мс, быстрый путь {feed.fast_ms:.1f} мс,'
+            f' ускорение x{feed.speedup:.1f}, JSON совпадает: '
+            f'{"да" if feed.identical else "нет"}')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump([{'name': result.endpoint.name,
+                            'status': result.status,
+                            'queries': result.queries,
+                            'ms': round(result.ms, 2),
+                            'bytes': result.size,
+                            'errors': result.errors} for result in results],
+                          output, ensure_ascii=False, indent=2)
+        failed = [result for result in results if result.errors]
+        if not feed.identical:
+            raise CommandError('Быстрая сборка ленты расходится с '
+                               'RecipeListSerializer.')
+        if failed:
+            raise CommandError('Бюджет превышен: ' + '; '.join(
+                f'{result.endpoint.name}: {", ".join(result.errors)}'
+                for result in failed))
+
+    def report(self, results):
+        self.stdout.write(f'{"эндпоинт":<40}{"статус":>7}{"запросы":>9}'
+                          f'{"мс":>9}{"байты":>10}')
+        for result in results:
+            line = (f'{result.endpoint.name:<40}{result.status:>7}'
+                    f'{result.queries:>5}/{result.endpoint.max_queries:<3}'
+                    f'{result.ms:>9.1f}{result.size:>10}')
+            style = self.style.ERROR if result.errors else self.style.SUCCESS
+            self.stdout.write(style(line))
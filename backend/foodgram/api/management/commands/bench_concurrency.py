@@ -0,0 +1,75 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.loadgen import hammer
+
+# Пары адресов: синхронный вьюсет DRF и его асинхронная версия.
+ENDPOINTS = {
+    'recipes': ('/api/recipes/', '/api/async/recipes/'),
+    'recipes-100': ('/api/recipes/?limit=100',
+                    '/api/async/recipes/?limit=100'),
+    'tags': ('/api/tags/', '/api/async/tags/'),
+    'ingredients': ('/api/ingredients/?name=а',
+                    '/api/async/ingredients/?name=а'),
+    'subscriptions': ('/api/users/subscriptions/?recipes_limit=3',
+                      '/api/async/users/subscriptions/?recipes_limit=3'),
+}
+
+
+def client_counts(value):
+    try:
+        counts = [int(count) for count in value.split(',')]
+    except ValueError:
+        raise CommandError('--clients: числа через запятую.')
+    if not counts or min(counts) < 1:
+        raise CommandError('--clients: числа должны быть больше нуля.')
+    return counts
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность синхронных эндпоинтов и их '
+        'асинхронных версий при разном числе одновременных клиентов. '
+        'Серверы должны быть уже запущены, например gunicorn '
+        'foodgram.wsgi и gunicorn -k uvicorn.workers.UvicornWorker '
+        'foodgram.asgi.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000',
+                            help='Адрес WSGI-сервера.')
+        parser.add_argument('--async-url',
+                            help='Адрес ASGI-сервера, по умолчанию --url.')
+        parser.add_argument('--endpoint', choices=ENDPOINTS,
+                            default='recipes')
+        parser.add_argument('--clients', type=client_counts,
+                            default=[1, 10, 100, 500],
+                            help='Числа клиентов через запятую.')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Длительность серии в секундах.')
+        parser.add_argument('--token', help='Токен пользователя.')
+
+    def handle(self, *args, **options):
+        sync_path, async_path = ENDPOINTS[options['endpoint']]
+        targets = (('sync', options['url'], sync_path),
+                   ('async', options['async_url'] or options['url'],
+                    async_path))
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        self.stdout.write(f'{"режим":<8}{"клиенты":>9}{"запросы":>9}'
+                          f'{"rps":>9}{"p50 мс":>9}{"p95 мс":>9}'
+                          f'{"p99 мс":>9}{"ошибки":>8}')
+        for clients in options['clients']:
+            for name, url, path in targets:
+                stats = asyncio.run(hammer(url, path, clients,
+                                           options['duration'], headers,
+                                           name=name))
+                line = (f'{stats.name:<8}{clients:>9}{stats.requests:>9}'
+                        f'{stats.rps:>9.1f}{stats.ms(0.5):>9.1f}'
+                        f'{stats.ms(0.95):>9.1f}{stats.ms(0.99):>9.1f}'
+                        f'{stats.errors:>8}')
+                style = self.style.ERROR if stats.errors else (
+                    self.style.SUCCESS)
+                self.stdout.write(style(line))
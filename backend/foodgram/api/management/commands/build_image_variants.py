@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from PIL import UnidentifiedImageError
+
+from recipes.images import update_image_variants
+from recipes.models import Recipes
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт уменьшенные копии изображений рецептов, у которых их ещё '
+        'нет. С --all пересоздаёт копии для всех рецептов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересоздать копии у всех рецептов.')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        recipes = Recipes.objects.exclude(image='').only(
+            'id', 'image', 'image_variants').order_by('id')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        built = failed = 0
+        for recipe in recipes.iterator(chunk_size=options['batch_size']):
+            try:
+                update_image_variants(recipe)
+            except (OSError, UnidentifiedImageError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.pk}: {error}')
+            else:
+                built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {built}. Ошибок: {failed}.'))
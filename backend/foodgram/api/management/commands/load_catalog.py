@@ -0,0 +1,183 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.caching import bump_catalog_version
+from recipes.models import Ingredients, Tags
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# Модель справочника: (модель, поля естественного ключа, обновляемые поля,
+# другие уникальные поля).
+CATALOG = {
+    'recipes.ingredients': (Ingredients, ('name', 'measurement_unit'), (),
+                            ()),
+    'recipes.tags': (Tags, ('slug',), ('name', 'color'), ('name', 'color')),
+}
+CSV_MODELS = {'ingredients': 'recipes.ingredients', 'tags': 'recipes.tags'}
+# Порядок колонок CSV без заголовка.
+CSV_COLUMNS = {'recipes.ingredients': ('name', 'measurement_unit'),
+               'recipes.tags': ('name', 'color', 'slug')}
+
+
+def iter_json_array(file):
+    """Читает элементы JSON-массива по одному, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer, eof = file.read(READ_CHUNK_SIZE).lstrip(), False
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError as error:
+            chunk = '' if eof else file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise CommandError(f'Ошибка в JSON: {error}')
+            eof = len(chunk) < READ_CHUNK_SIZE
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def json_records(file, default_label):
+    """Поддерживает фикстуры Django и простые списки объектов."""
+    for item in iter_json_array(file):
+        if 'fields' in item:
+            yield item.get('model', default_label).lower(), item['fields']
+        else:
+            yield default_label, item
+
+
+def csv_records(file, label):
+    """Строки CSV с заголовком или без него в порядке полей модели."""
+    fields = CSV_COLUMNS[label]
+    rows = csv.reader(file)
+    first = next(rows, None)
+    if first is None:
+        return
+    if set(fields) <= {column.strip() for column in first}:
+        fields = [column.strip() for column in first]
+    else:
+        yield label, dict(zip(fields, first))
+    for row in rows:
+        if row:
+            yield label, dict(zip(fields, row))
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает справочники ингредиентов и тегов из JSON (фикстура '
+        'Django или список объектов) или CSV. Повторная загрузка '
+        'обновляет существующие записи и не создаёт дубликатов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', type=Path)
+        parser.add_argument('--model', choices=CSV_MODELS,
+                            default='ingredients',
+                            help='Справочник для CSV и списков без модели.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        label = CSV_MODELS[options['model']]
+        totals = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        with transaction.atomic():
+            for path in options['paths']:
+                with path.open(encoding='utf-8', newline='') as file:
+                    if path.suffix.lower() == '.csv':
+                        records = csv_records(file, label)
+                    else:
+                        records = json_records(file, label)
+                    self.load(records, options['batch_size'], totals)
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {totals["inserted"]}, обновлено: '
+            f'{totals["updated"]}, без изменений: {totals["skipped"]} '
+            f'за {time.perf_counter() - start:.2f} с.'))
+
+    def load(self, records, size, totals):
+        while True:
+            batch = list(islice(records, size))
+            if not batch:
+                return
+            by_label = {}
+            for label, fields in batch:
+                if label not in CATALOG:
+                    raise CommandError(f'Неизвестный справочник: {label}')
+                by_label.setdefault(label, []).append(fields)
+            for label, rows in by_label.items():
+                for key, count in self.upsert(label, rows).items():
+                    totals[key] += count
+
+    def check_unique(self, label, incoming):
+        """
+        Значение уникального поля не должно принадлежать записи с другим
+        ключом ни в файле, ни в базе: bulk_create разрешает конфликты
+        только по ключу и упал бы с IntegrityError.
+        """
+        model, key_fields, _, unique_fields = CATALOG[label]
+        conflicts = []
+        for field in unique_fields:
+            owners = {}
+            for key, values in incoming.items():
+                owner = owners.setdefault(values[field], key)
+                if owner != key:
+                    conflicts.append(f'{field}={values[field]!r} в файле у '
+                                     f'{"/".join(owner)} и {"/".join(key)}')
+            for row in model.objects.filter(**{
+                    f'{field}__in': owners}).values(field, *key_fields):
+                key = tuple(row[name] for name in key_fields)
+                owner = owners[row[field]]
+                if key != owner:
+                    conflicts.append(f'{field}={row[field]!r} в файле у '
+                                     f'{"/".join(owner)}, в базе у '
+                                     f'{"/".join(key)}')
+        if conflicts:
+            raise CommandError(f'{label}: конфликт уникальных полей: '
+                               + '; '.join(conflicts))
+
+    def upsert(self, label, rows):
+        model, key_fields, update_fields, _ = CATALOG[label]
+        fields = key_fields + update_fields
+        incoming = {}
+        for row in rows:
+            try:
+                values = {field: str(row[field]).strip() for field in fields}
+            except KeyError as error:
+                raise CommandError(f'{label}: нет поля {error} в {row}')
+            incoming[tuple(values[field] for field in key_fields)] = values
+        self.check_unique(label, incoming)
+        existing = {
+            tuple(values[field] for field in key_fields): values
+            for values in model.objects.filter(**{
+                f'{key_fields[0]}__in': {key[0] for key in incoming}
+            }).values(*fields)
+        }
+        changed = [values for key, values in incoming.items()
+                   if existing.get(key) != values]
+        inserted = sum(key not in existing for key in incoming)
+        if update_fields:
+            model.objects.bulk_create(
+                (model(**values) for values in changed),
+                update_conflicts=True, unique_fields=key_fields,
+                update_fields=update_fields)
+        else:
+            model.objects.bulk_create(
+                (model(**values) for values in changed),
+                ignore_conflicts=True)
+        return {'inserted': inserted,
+                'updated': len(changed) - inserted,
+                'skipped': len(incoming) - len(changed)}
@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.loadgen import LoadStats
+from api.loadtest import LoadTestError, run_loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест по сценариям пользователей против запущенного '
+        'сервера (runserver, gunicorn) на SQLite или PostgreSQL. '
+        'Пользователи и токены создаются через API, рецепты, теги и '
+        'ингредиенты должны уже быть в базе. Выводит пропускную '
+        'способность и p50/p95/p99 по эндпоинтам. SQLite не допускает '
+        'одновременной записи из нескольких процессов: с несколькими '
+        'воркерами gunicorn часть записей завершится ошибкой database '
+        'is locked, для таких замеров нужен PostgreSQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--users', type=int, default=20,
+                            help='Сколько пользователей зарегистрировать.')
+        parser.add_argument('--clients', type=int, default=20,
+                            help='Одновременных виртуальных пользователей.')
+        parser.add_argument('--duration', type=float, default=60,
+                            help='Длительность теста в секундах.')
+        parser.add_argument('--think', type=float, default=0,
+                            help='Средняя пауза между запросами, с.')
+        parser.add_argument('--password', default='loadtest-password')
+        parser.add_argument('--seed', type=int,
+                            help='Зерно случайного выбора сценариев.')
+        parser.add_argument('--output',
+                            help='Сохранить результаты в JSON-файл.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['clients'] < 1:
+            raise CommandError('--users и --clients должны быть больше 0.')
+        try:
+            stats, elapsed = asyncio.run(run_loadtest(
+                options['url'], users=options['users'],
+                clients=options['clients'], duration=options['duration'],
+                think=options['think'], password=options['password'],
+                seed=options['seed']))
+        except (LoadTestError, OSError) as error:
+            raise CommandError(error)
+        total = LoadStats('всего', options['clients'], elapsed)
+        for endpoint in stats.values():
+            total.latencies.extend(endpoint.latencies)
+            total.errors += endpoint.errors
+        rows = [*sorted(stats.values(), key=lambda item: item.name), total]
+        self.report(rows)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump([{'name': row.name, 'requests': row.requests,
+                            'rps': round(row.rps, 2),
+                            'p50_ms': round(row.ms(0.5), 2),
+                            'p95_ms': round(row.ms(0.95), 2),
+                            'p99_ms': round(row.ms(0.99), 2),
+                            'errors': row.errors} for row in rows],
+                          output, ensure_ascii=False, indent=2)
+
+    def report(self, rows):
+        self.stdout.write(f'{"эндпоинт":<34}{"запросы":>9}{"rps":>9}'
+                          f'{"p50 мс":>9}{"p95 мс":>9}{"p99 мс":>9}'
+                          f'{"ошибки":>8}')
+        for row in rows:
+            line = (f'{row.name:<34}{row.requests:>9}{row.rps:>9.1f}'
+                    f'{row.ms(0.5):>9.1f}{row.ms(0.95):>9.1f}'
+                    f'{row.ms(0.99):>9.1f}{row.errors:>8}')
+            style = self.style.ERROR if row.errors else self.style.SUCCESS
+            self.stdout.write(style(line))
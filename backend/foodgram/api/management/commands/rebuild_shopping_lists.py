@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.services import calculate_shopping_lists
+from recipes.models import ShoppingListItem
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает списки покупок пользователей по их корзинам. '
+        'С --check только сверяет сохранённые суммы с пересчитанными.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только проверить, ничего не меняя.')
+        parser.add_argument('--user', type=int, action='append',
+                            help='id пользователя, можно указать несколько.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id').values_list('id', flat=True)
+        if options['user']:
+            users = users.filter(id__in=options['user'])
+        users = list(users)
+        size = options['batch_size']
+        drifted = 0
+        for start in range(0, len(users), size):
+            batch = users[start:start + size]
+            with transaction.atomic():
+                drifted += self.process(batch, options['check'])
+        if options['check'] and drifted:
+            raise CommandError(
+                f'Расхождения в списках покупок у {drifted} пользователей.')
+        action = 'Найдено' if options['check'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено пользователей: {len(users)}. '
+            f'{action} расхождений: {drifted}.'))
+
+    def process(self, users, check):
+        expected = calculate_shopping_lists(users)
+        stored = {
+            (item.author_id, item.ingredient_id): item.amount
+            for item in ShoppingListItem.objects.select_for_update().filter(
+                author__in=users)
+        }
+        drifted = {
+            author for author, ingredient in expected.keys() | stored.keys()
+            if expected.get((author, ingredient)) != stored.get(
+                (author, ingredient))
+        }
+        if check or not drifted:
+            return len(drifted)
+        ShoppingListItem.objects.filter(author__in=drifted).delete()
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(author_id=author, ingredient_id=ingredient,
+                             amount=amount)
+            for (author, ingredient), amount in expected.items()
+            if author in drifted)
+        return len(drifted)
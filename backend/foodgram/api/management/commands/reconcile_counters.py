@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.services import COUNTERS, actual_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики рецептов и пользователей с фактическим числом '
+        'записей и исправляет расхождения. С --check только сверяет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только проверить, ничего не меняя.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        drifted = 0
+        for model in COUNTERS:
+            fixed = self.reconcile(model, options['batch_size'],
+                                   options['check'])
+            self.stdout.write(f'{model._meta.label}: '
+                              f'расхождений {fixed}.')
+            drifted += fixed
+        if options['check'] and drifted:
+            raise CommandError(f'Расхождения в счётчиках: {drifted}.')
+        action = 'Найдено' if options['check'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} расхождений: {drifted}.'))
+
+    def reconcile(self, model, size, check):
+        fields = list(COUNTERS[model])
+        actual = {f'actual_{field}': expression
+                  for field, expression in actual_counters(model).items()}
+        drifted = last = 0
+        while True:
+            with transaction.atomic():
+                batch = list(model.objects.select_for_update().filter(
+                    pk__gt=last
+                ).order_by('pk').annotate(**actual).only('pk', *fields)[:size])
+                if not batch:
+                    return drifted
+                last = batch[-1].pk
+                changed = []
+                for obj in batch:
+                    values = {field: getattr(obj, f'actual_{field}')
+                              for field in fields}
+                    if any(getattr(obj, field) != value
+                           for field, value in values.items()):
+                        for field, value in values.items():
+                            setattr(obj, field, value)
+                        changed.append(obj)
+                drifted += len(changed)
+                if changed and not check:
+                    model.objects.bulk_update(changed, fields)
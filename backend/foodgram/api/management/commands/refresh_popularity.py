@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from api.caching import bump_recipe_lists_version
+from recipes.popularity import refresh_popularity
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает популярность рецептов для ?ordering=popular. '
+        'По умолчанию только рецепты, у которых после прошлого запуска '
+        'изменилось избранное или списки покупок. Запускайте '
+        'периодически, например из cron раз в несколько минут.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Пересчитать все рецепты.')
+
+    def handle(self, *args, **options):
+        count = refresh_popularity(full=options['full'])
+        if count:
+            bump_recipe_lists_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитана популярность рецептов: {count}.'))
@@ -1,4 +1,14 @@
+from base64 import b64decode, b64encode
+from binascii import Error as DecodeError
+from collections import OrderedDict
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 from core.constants import POSTS_ON_PAGE
 
@@ -7,3 +17,145 @@ class ApiPagination(PageNumberPagination):
     """Паджинация для отображения 6 рецептов на странице."""
     page_size_query_param = "limit"
     page_size = POSTS_ON_PAGE
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        paginate_queryset для асинхронных представлений: те же параметры,
+        ссылки и ошибки, запросы идут через асинхронный ORM.
+        """
+        self.request = request
+        paginator = self.django_paginator_class(
+            queryset, self.get_page_size(request))
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)))
+        return [item async for item in self.page.object_list]
+
+
+class RecipePagination(ApiPagination):
+    """
+    Паджинация ленты рецептов. С параметром cursor переключается на
+    курсорную паджинацию по (pub_date, id): без OFFSET и без COUNT,
+    если он не запрошен параметром count. Если фильтры задали свою
+    сортировку (поиск, популярные), остаётся постраничной.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self.cursor_page(queryset, request)
+        if page is None:
+            return super().paginate_queryset(queryset, request, view)
+        if self.count_requested(request):
+            self.count = queryset.count()
+        return self.set_results(list(page))
+
+    async def apaginate_queryset(self, queryset, request):
+        page = self.cursor_page(queryset, request)
+        if page is None:
+            return await super().apaginate_queryset(queryset, request)
+        if self.count_requested(request):
+            self.count = await queryset.acount()
+        return self.set_results([item async for item in page])
+
+    def cursor_page(self, queryset, request):
+        """
+        Срез queryset на курсорную страницу с одной лишней записью или
+        None, если курсор не запрошен или сортировку задал фильтр.
+        """
+        self.use_cursor = (self.cursor_query_param in request.query_params
+                           and not queryset.query.order_by)
+        if not self.use_cursor:
+            return None
+        self.request = request
+        self.count = None
+        self.reverse, self.position = self.decode_cursor(request)
+        queryset = queryset.order_by('-pub_date', '-id')
+        if self.position is not None:
+            pub_date, pk = self.position
+            if self.reverse:
+                queryset = queryset.filter(
+                    Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=pk)
+                ).order_by('pub_date', 'id')
+            else:
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk))
+        return queryset[:self.get_page_size(request) + 1]
+
+    def count_requested(self, request):
+        return request.query_params.get(self.count_query_param) in (
+            '1', 'true')
+
+    def set_results(self, results):
+        page_size = self.get_page_size(self.request)
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        following = self.position is not None
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = following, has_more
+        else:
+            self.has_next, self.has_previous = has_more, following
+        self.results = results
+        return results
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            direction, pub_date, pk = b64decode(
+                encoded.encode(), altchars=b'-_', validate=True
+            ).decode().split('|')
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (DecodeError, UnicodeDecodeError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None or direction not in ('n', 'p'):
+            raise NotFound(self.invalid_cursor_message)
+        return direction == 'p', (pub_date, pk)
+
+    @staticmethod
+    def make_cursor(direction, pub_date, pk):
+        return b64encode(f'{direction}|{pub_date.isoformat()}|{pk}'.encode(),
+                         altchars=b'-_').decode()
+
+    def encode_cursor(self, direction, recipe):
+        if isinstance(recipe, dict):
+            cursor = self.make_cursor(direction, recipe['pub_date'],
+                                      recipe['id'])
+        else:
+            cursor = self.make_cursor(direction, recipe.pub_date, recipe.pk)
+        url = remove_query_param(self.request.build_absolute_uri(),
+                                 self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next or not self.results:
+            return None
+        return self.encode_cursor('n', self.results[-1])
+
+    def get_previous_link(self):
+        if not self.use_cursor:
+            return super().get_previous_link()
+        if not self.has_previous or not self.results:
+            return None
+        return self.encode_cursor('p', self.results[0])
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
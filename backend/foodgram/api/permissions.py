@@ -19,3 +19,11 @@ class AdminOrOwner(BasePermission):
             or request.user == obj.author
             or request.user.admin
         )
+
+
+class IsAdmin(BasePermission):
+    """Доступ только администраторам."""
+
+    def has_permission(self, request, view):
+        user = request.user
+        return user.is_authenticated and (user.admin or user.is_staff)
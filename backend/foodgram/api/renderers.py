@@ -0,0 +1,63 @@
+import json
+
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class TextRenderer(BaseRenderer):
+    """
+    Рендерер текстовых выгрузок. Сами выгрузки отдаются потоком,
+    через рендерер проходят только сообщения об ошибках.
+    """
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, str):
+            data = json.dumps(data, ensure_ascii=False)
+        return data.encode('utf-8')
+
+
+class PrometheusRenderer(TextRenderer):
+    """Текстовый формат экспозиции метрик Prometheus."""
+    format = 'prometheus'
+
+
+class CSVRenderer(TextRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFRenderer(TextRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson. В компактном режиме выдаёт те же байты, что
+    и стандартный рендерер: даты и прочие типы, которые orjson пишет
+    по-своему, передаются кодировщику DRF. С отступами (browsable API,
+    заголовок Accept с indent) и на неизвестных orjson данных работает
+    стандартный рендерер.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        try:
+            rendered = orjson.dumps(data, default=self.encoder_class().default,
+                                    option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        return rendered.replace('\u2028'.encode(), b'\\u2028').replace(
+            '\u2029'.encode(), b'\\u2029')
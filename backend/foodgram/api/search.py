@@ -0,0 +1,239 @@
+import heapq
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from collections.abc import Sequence
+from itertools import chain
+from operator import itemgetter
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from rest_framework.response import Response
+
+from api.caching import (RECIPE_INGREDIENTS_VERSION_KEY, get_catalog_version,
+                         get_version, recipe_ingredients_change_key)
+from core.constants import (INGREDIENT_INDEX_MAX_SIZE,
+                            RECIPE_INGREDIENT_CHANGES_MAX,
+                            RECIPE_INGREDIENT_INDEX_MAX_SIZE)
+from recipes.models import Ingredients, IngredientsForRecipes, Recipes
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для поиска по началу названия.
+    Строится при первом запросе и перестраивается, когда меняется
+    версия каталога, в том числе после изменений в другом процессе.
+    """
+
+    def __init__(self, max_size=INGREDIENT_INDEX_MAX_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+
+    def is_stale(self, version):
+        return self._version != version
+
+    def build(self):
+        ingredients = list(Ingredients.objects.order_by().values_list(
+            'id', 'name', 'measurement_unit')[:self.max_size + 1])
+        if len(ingredients) > self.max_size:
+            return None
+        ingredients.sort(key=lambda item: (item[1].lower(), item[0]))
+        keys = [name.lower() for _, name, _ in ingredients]
+        items = [{'id': pk, 'name': name, 'measurement_unit': unit}
+                 for pk, name, unit in ingredients]
+        return keys, items
+
+    def get_index(self):
+        version = get_catalog_version()
+        if self.is_stale(version):
+            with self._lock:
+                if self.is_stale(version):
+                    self._index = self.build()
+                    self._version = version
+        return self._index
+
+    def search(self, prefix):
+        """
+        Возвращает все ингредиенты, название которых начинается с prefix
+        без учёта регистра, в порядке id, как и запрос к базе, или None,
+        если индекс недоступен.
+        """
+        index = self.get_index()
+        if index is None:
+            return None
+        keys, items = index
+        prefix = prefix.lower()
+        start = bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+        return sorted(items[start:end], key=itemgetter('id'))
+
+
+ingredient_index = IngredientIndex()
+
+
+class IngredientSearchMixin:
+    """
+    Отвечает на поиск по названию из индекса в памяти, база данных
+    используется, только если индекс недоступен.
+    """
+    search_param = 'name'
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(self.search_param)
+        if name:
+            ingredients = ingredient_index.search(name)
+            if ingredients is not None:
+                return Response(ingredients)
+        return super().list(request, *args, **kwargs)
+
+
+class RecipeIngredientIndex:
+    """
+    Обратный индекс в памяти процесса: для каждого ингредиента множество
+    рецептов, в которые он входит. Строится при первом запросе, затем
+    догоняет журнал изменений состава рецептов в общем кэше и заново
+    читает только изменённые рецепты. Целиком перестраивается, если
+    журнал прерван: кэш очищен или пропущено слишком много изменений.
+    """
+
+    def __init__(self, max_size=RECIPE_INGREDIENT_INDEX_MAX_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+
+    def is_stale(self, version):
+        return self._version != version
+
+    @staticmethod
+    def group(rows):
+        ingredients = defaultdict(set)
+        for recipe, ingredient in rows:
+            ingredients[recipe].add(ingredient)
+        return ingredients
+
+    def build(self):
+        rows = list(IngredientsForRecipes.objects.order_by().values_list(
+            'recipe', 'ingredient')[:self.max_size + 1])
+        if len(rows) > self.max_size:
+            return None
+        recipes = defaultdict(set)
+        for recipe, ingredient in rows:
+            recipes[ingredient].add(recipe)
+        return dict(recipes), dict(self.group(rows))
+
+    def changed_recipes(self, version):
+        """Рецепты из журнала между версиями или None, если он прерван."""
+        if self._index is None or self._version is None:
+            return None
+        if not 0 < version - self._version <= RECIPE_INGREDIENT_CHANGES_MAX:
+            return None
+        keys = [recipe_ingredients_change_key(number)
+                for number in range(self._version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        return set(changes.values())
+
+    def apply(self, changed):
+        """
+        Новый индекс с обновлёнными рецептами. Старый не меняется, чтобы
+        его могли читать другие потоки.
+        """
+        recipes, ingredients = dict(self._index[0]), dict(self._index[1])
+        fresh = self.group(IngredientsForRecipes.objects.filter(
+            recipe__in=changed).values_list('recipe', 'ingredient'))
+        for recipe in changed:
+            old = ingredients.pop(recipe, set())
+            new = fresh.get(recipe, set())
+            for ingredient in old - new:
+                recipes[ingredient] = recipes[ingredient] - {recipe}
+            for ingredient in new - old:
+                recipes[ingredient] = recipes.get(ingredient, set()) | {
+                    recipe}
+            if new:
+                ingredients[recipe] = new
+        return recipes, ingredients
+
+    def get_index(self):
+        version = get_version(RECIPE_INGREDIENTS_VERSION_KEY)
+        if self.is_stale(version):
+            with self._lock:
+                if self.is_stale(version):
+                    changed = self.changed_recipes(version)
+                    self._index = (self.build() if changed is None
+                                   else self.apply(changed))
+                    self._version = version
+        return self._index
+
+    def match(self, ingredient_ids):
+        """
+        Для рецептов хотя бы с одним из ингредиентов возвращает тройки
+        (рецепт, совпало ингредиентов, всего ингредиентов) или None,
+        если индекс недоступен.
+        """
+        index = self.get_index()
+        if index is None:
+            return None
+        recipes, ingredients = index
+        matched = Counter(chain.from_iterable(
+            recipes.get(ingredient, ()) for ingredient in ingredient_ids))
+        return [(recipe, count, len(ingredients[recipe]))
+                for recipe, count in matched.items()]
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
+
+
+def match_in_database(ingredient_ids):
+    """То же, что RecipeIngredientIndex.match, одним запросом к базе."""
+    return Recipes.objects.order_by().annotate(
+        matched=Count('recipes_ingredients__ingredient', distinct=True,
+                      filter=Q(recipes_ingredients__ingredient__in=(
+                          ingredient_ids))),
+        total=Count('recipes_ingredients__ingredient', distinct=True),
+    ).filter(matched__gt=0).values_list('id', 'matched', 'total')
+
+
+class RecipeMatches(Sequence):
+    """
+    Рецепты по убыванию доли имеющихся ингредиентов, при равной доле
+    сначала те, где докупать меньше, затем новые. Элементы — тройки
+    (рецепт, совпало, не хватает). Для страницы сортируются только
+    первые кандидаты, а не все.
+    """
+
+    def __init__(self, scores):
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if index.stop is None:
+            top = sorted(self.scores)
+        else:
+            top = heapq.nsmallest(index.stop, self.scores)
+        return [(-recipe, matched, missing)
+                for _, missing, recipe, matched in top[index]]
+
+
+def match_recipes(ingredients, max_missing=None):
+    """
+    Подбирает рецепты по имеющимся ингредиентам из индекса в памяти,
+    к базе обращается, только если индекс недоступен.
+    """
+    ingredients = set(ingredients)
+    counts = recipe_ingredient_index.match(ingredients)
+    if counts is None:
+        counts = match_in_database(ingredients)
+    return RecipeMatches([
+        (-matched / total, total - matched, -recipe, matched)
+        for recipe, matched, total in counts
+        if max_missing is None or total - matched <= max_missing])
@@ -1,13 +1,21 @@
-from drf_extra_fields.fields import Base64ImageField
+import json
 
-from django.shortcuts import get_object_or_404
+from drf_extra_fields.fields import HybridImageField
+
+from django.db import transaction
+from django.http import QueryDict
 from rest_framework import serializers, status
 from rest_framework.exceptions import ValidationError
 
-from core.constants import (MIN_AMOUNT_INREDIENTS, MIN_TIME_COOKING,
-                            MAX_TIME_COOKING)
+from api.feed import represent_image_variants
+from api.services import change_counter, tracking_shopping_lists
+from jobs.queue import enqueue
+from core.constants import (IMAGE_MAX_PIXELS, IMAGE_MAX_UPLOAD_SIZE,
+                            MIN_AMOUNT_INREDIENTS, MIN_TIME_COOKING,
+                            MAX_TIME_COOKING, RECIPE_MATCH_MAX_INGREDIENTS)
 from recipes.models import (Favorites, Ingredients, IngredientsForRecipes,
                             Recipes, ShoppingCart, Tags)
+from recipes.tasks import build_recipe_image_variants
 from users.models import Follow, User
 
 
@@ -46,12 +54,48 @@ class TagsSerializer(serializers.ModelSerializer):
         read_only_fields = '__all__',
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    Ссылки на уменьшенные копии изображения рецепта по размерам и
+    готовые значения srcset для каждого формата.
+    """
+
+    def to_representation(self, variants):
+        return represent_image_variants(variants, self.context.get('request'))
+
+
+class RecipeImageField(HybridImageField):
+    """
+    Изображение рецепта: строка base64 в JSON или файл в multipart/form-data.
+    Размер проверяется до декодирования, число пикселей - по заголовку
+    изображения, до того как оно будет распаковано целиком.
+    """
+    default_error_messages = {
+        'too_large': 'Размер изображения не должен превышать '
+                     f'{IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)} МБ.',
+        'too_many_pixels': 'Изображение не должно быть больше '
+                           f'{IMAGE_MAX_PIXELS // 1_000_000} Мп.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            size = len(data.split(';base64,')[-1]) * 3 // 4
+        else:
+            size = getattr(data, 'size', 0)
+        if size > IMAGE_MAX_UPLOAD_SIZE:
+            self.fail('too_large')
+        file = super().to_internal_value(data)
+        width, height = file.image.size
+        if width * height > IMAGE_MAX_PIXELS:
+            self.fail('too_many_pixels')
+        return file
+
+
 class AddIngredientSerializer(serializers.ModelSerializer):
     """
     Сериализатор поля ingredients, модели Recipes для создание ингредиентов.
     """
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredients.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -83,7 +127,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     tags = serializers.PrimaryKeyRelatedField(
         queryset=Tags.objects.all(),
         many=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
     author = serializers.HiddenField(
         default=serializers.CurrentUserDefault())
 
@@ -92,6 +136,23 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         fields = ('ingredients', 'tags', 'image',
                   'name', 'text', 'cooking_time', 'author')
 
+    def to_internal_value(self, data):
+        """
+        В multipart/form-data теги передаются повторяющимся полем tags,
+        а ингредиенты - строкой JSON в поле ingredients.
+        """
+        if isinstance(data, QueryDict):
+            tags = data.getlist('tags')
+            data = data.dict()
+            data['tags'] = tags
+            if isinstance(data.get('ingredients'), str):
+                try:
+                    data['ingredients'] = json.loads(data['ingredients'])
+                except ValueError:
+                    raise ValidationError(
+                        {'ingredients': 'Ожидается список в формате JSON.'})
+        return super().to_internal_value(data)
+
     def validate_cooking_time(self, value):
         if MIN_TIME_COOKING < value > MAX_TIME_COOKING:
             raise ValidationError(
@@ -106,17 +167,21 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         if not ingredients:
             raise ValidationError(
                 {'ingredients': 'Нужно выбрать ингредиент!'})
-        ingredients_list = []
+        ingredients_ids = [item['id'] for item in ingredients]
+        if len(set(ingredients_ids)) != len(ingredients_ids):
+            raise ValidationError(
+                {'ingredients': 'Ингридиенты повторяются!'})
         for item in ingredients:
-            ingredient = get_object_or_404(Ingredients, name=item['id'])
-            if ingredient in ingredients_list:
-                raise ValidationError(
-                    {'ingredients': 'Ингридиенты повторяются!'})
             if int(item['amount']) <= MIN_AMOUNT_INREDIENTS:
                 raise ValidationError(
                     {'amount': 'Количество должно быть от'
                      f' {MIN_AMOUNT_INREDIENTS} или больше.'})
-            ingredients_list.append(ingredient)
+        missing = set(ingredients_ids) - Ingredients.objects.in_bulk(
+            ingredients_ids).keys()
+        if missing:
+            raise ValidationError(
+                {'ingredients': 'Ингридиенты не найдены: '
+                 f'{", ".join(map(str, sorted(missing)))}.'})
         return value
 
     def validate_tags(self, value):
@@ -135,30 +200,48 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         ingredients = super().to_representation(instance)
         ingredients['ingredients'] = IngredientRecipeSerializer(
-            instance.recipes_ingredients.all(), many=True).data
+            instance.recipes_ingredients.select_related('ingredient'),
+            many=True).data
         return ingredients
 
     def add_tags_ingredients(self, ingredients, tags, model):
-        for ingredient in ingredients:
-            IngredientsForRecipes.objects.update_or_create(
-                recipe=model,
-                ingredient=ingredient['id'],
-                amount=ingredient['amount'])
+        IngredientsForRecipes.objects.bulk_create(
+            IngredientsForRecipes(recipe=model,
+                                  ingredient_id=ingredient['id'],
+                                  amount=ingredient['amount'])
+            for ingredient in ingredients)
         model.tags.set(tags)
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = super().create(validated_data)
         self.add_tags_ingredients(ingredients, tags, recipe)
+        change_counter(recipe.author, 'recipes_count')
+        enqueue(build_recipe_image_variants, recipe_id=recipe.pk)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        instance.ingredients.clear()
-        self.add_tags_ingredients(ingredients, tags, instance)
-        return super().update(instance, validated_data)
+        with tracking_shopping_lists([instance.pk]):
+            instance.ingredients.clear()
+            self.add_tags_ingredients(ingredients, tags, instance)
+        image = instance.image.name
+        recipe = super().update(instance, validated_data)
+        if recipe.image.name != image:
+            enqueue(build_recipe_image_variants, recipe_id=recipe.pk)
+        return recipe
+
+
+class RecipeMatchQuerySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), min_length=1,
+        max_length=RECIPE_MATCH_MAX_INGREDIENTS)
+    max_missing = serializers.IntegerField(min_value=0, required=False)
 
 
 class RecipeListSerializer(serializers.ModelSerializer):
@@ -171,27 +254,33 @@ class RecipeListSerializer(serializers.ModelSerializer):
         read_only=True)
     ingredients = IngredientRecipeSerializer(
         many=True,
-        source='ingredients_ingredients',
+        source='recipes_ingredients',
         read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    images = ImageVariantsField(source='image_variants')
 
     class Meta:
         model = Recipes
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart', 'name', 'image',
-                  'text', 'cooking_time')
+                  'images', 'text', 'cooking_time')
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if not user.is_anonymous:
-            return Favorites.objects.filter(recipe=obj).exists()
+            return Favorites.objects.filter(author=user, recipe=obj).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if not user.is_anonymous:
-            return ShoppingCart.objects.filter(recipe=obj).exists()
+            return ShoppingCart.objects.filter(
+                author=user, recipe=obj).exists()
         return False
 
 
@@ -203,6 +292,7 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
     image = serializers.ImageField(
         source='recipe.image',
         read_only=True)
+    images = ImageVariantsField(source='recipe.image_variants')
     coocking_time = serializers.IntegerField(
         source='recipe.cooking_time',
         read_only=True)
@@ -220,22 +310,23 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ShoppingCart
-        fields = ('id', 'name', 'image', 'coocking_time')
+        fields = ('id', 'name', 'image', 'images', 'coocking_time')
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
     """Сериализатор модели Favorites."""
     name = serializers.ReadOnlyField(
-        source='recipes.name',
+        source='recipe.name',
         read_only=True)
     image = serializers.ImageField(
-        source='recipes.image',
+        source='recipe.image',
         read_only=True)
+    images = ImageVariantsField(source='recipe.image_variants')
     coocking_time = serializers.IntegerField(
-        source='recipes.cooking_time',
+        source='recipe.cooking_time',
         read_only=True)
     id = serializers.PrimaryKeyRelatedField(
-        source='recipes',
+        source='recipe',
         read_only=True)
 
     def validate(self, data):
@@ -248,14 +339,16 @@ class FavoriteSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Favorites
-        fields = ('id', 'name', 'image', 'coocking_time')
+        fields = ('id', 'name', 'image', 'images', 'coocking_time')
 
 
 class RecipeMiniSerializer(serializers.ModelSerializer):
     """Сериализатор предназначен для вывода рецептом в FollowSerializer."""
+    images = ImageVariantsField(source='image_variants')
+
     class Meta:
         model = Recipes
-        fields = ('id', 'name', 'cooking_time', 'image')
+        fields = ('id', 'name', 'cooking_time', 'image', 'images')
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -276,22 +369,21 @@ class FollowSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         user = self.context.get('request').user
-        if not user.is_anonymous:
-            return Follow.objects.filter(
-                user=obj.user,
-                author=obj.author).exists()
-        return False
+        return not user.is_anonymous and obj.user_id == user.id
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = Recipes.objects.filter(author=obj.author)
-        if limit and limit.isdigit():
-            recipes = recipes[:int(limit)]
-        return RecipeMiniSerializer(recipes, many=True).data
+        recipes = getattr(obj.author, 'limited_recipes', None)
+        if recipes is None:
+            request = self.context.get('request')
+            limit = request.GET.get('recipes_limit')
+            recipes = Recipes.objects.filter(author=obj.author)
+            if limit and limit.isdigit():
+                recipes = recipes[:int(limit)]
+        return RecipeMiniSerializer(recipes, many=True,
+                                    context=self.context).data
 
     def get_recipes_count(self, obj):
-        return Recipes.objects.filter(author=obj.author).count()
+        return obj.author.recipes_count
 
     def validate(self, data):
         author = self.context.get('author')
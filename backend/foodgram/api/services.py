@@ -1,29 +1,272 @@
+import csv
+import json
+from collections import defaultdict
+from contextlib import contextmanager
 from datetime import date
+from functools import reduce
+from operator import or_
+from tempfile import SpooledTemporaryFile
 
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import (Case, Count, F, IntegerField, OuterRef, Q,
+                              Subquery, Sum, Value, When)
+from django.db.models.functions import Coalesce, Greatest
+from django.http import StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
 
-from recipes.models import IngredientsForRecipes
+from core.constants import (PDF_FONT_SIZE, PDF_LINE_HEIGHT, PDF_MARGIN,
+                            SHOPPING_LIST_CHUNK_SIZE)
+from recipes.models import (Favorites, IngredientsForRecipes, Recipes,
+                            ShoppingCart, ShoppingListItem)
+from users.models import Follow, User
 
+PDF_FONT_NAME = 'ShoppingListFont'
 
-def shopping_cart(self, request, author):
-    """Загрузка рецепта из корзины с выбранными рецептами."""
-    sum_ingredients_in_recipes = IngredientsForRecipes.objects.filter(
-        recipe__shopping_cart__author=author
+
+class Echo:
+    """Буфер для csv.writer, который сразу возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def get_shopping_list(author):
+    """Суммы ингредиентов по всем рецептам из корзины пользователя."""
+    return ShoppingListItem.objects.filter(author=author).values(
+        'ingredient__name', 'ingredient__measurement_unit',
+        amounts=F('amount')
+    ).order_by('ingredient__name').iterator(
+        chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+
+
+def calculate_shopping_lists(authors):
+    """Суммы ингредиентов из корзин, посчитанные заново по рецептам."""
+    totals = IngredientsForRecipes.objects.filter(
+        recipe__shopping_cart__author__in=authors
     ).values(
-        'ingredient__name', 'ingredient__measurement_unit'
-    ).annotate(
-        amounts=Sum('amount', distinct=True)).order_by('ingredient__name')
-    today = date.today().strftime("%d-%m-%Y")
-    shopping_list = f'Список покупок на: {today}\n\n'
-    for ingredient in sum_ingredients_in_recipes:
-        shopping_list += (
+        'recipe__shopping_cart__author', 'ingredient'
+    ).annotate(total=Sum('amount')).order_by()
+    return {(item['recipe__shopping_cart__author'], item['ingredient']):
+            item['total'] for item in totals}
+
+
+def add_shopping_list_amounts(increments):
+    """
+    Прибавляет положительные количества одним INSERT ... ON CONFLICT.
+    Строка, которую одновременно вставил другой запрос, не приводит к
+    IntegrityError: количества складываются в базе.
+    """
+    table = connection.ops.quote_name(ShoppingListItem._meta.db_table)
+    rows = ', '.join(['(%s, %s, %s)'] * len(increments))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (author_id, ingredient_id, amount) '
+            f'VALUES {rows} ON CONFLICT (author_id, ingredient_id) '
+            f'DO UPDATE SET amount = {table}.amount + EXCLUDED.amount',
+            [value for (author, ingredient), amount in increments.items()
+             for value in (author, ingredient, amount)])
+
+
+def subtract_shopping_list_amounts(decrements):
+    """
+    Вычитает количества одним UPDATE по точным парам (автор, ингредиент)
+    и удаляет позиции, в которых ничего не осталось.
+    """
+    keys = reduce(or_, (Q(author_id=author, ingredient_id=ingredient)
+                        for author, ingredient in decrements))
+    ShoppingListItem.objects.filter(keys).update(amount=Greatest(
+        F('amount') - Case(*(
+            When(author_id=author, ingredient_id=ingredient, then=amount)
+            for (author, ingredient), amount in decrements.items()),
+            default=0, output_field=IntegerField()),
+        Value(0)))
+    ShoppingListItem.objects.filter(keys, amount=0).delete()
+
+
+def apply_shopping_list_deltas(deltas):
+    """
+    Применяет изменения к спискам покупок.
+    deltas - словарь {(id автора, id ингредиента): изменение количества}.
+    Каждая строка меняется атомарно в базе, без чтения и блокировок.
+    """
+    deltas = list((key, delta) for key, delta in deltas.items() if delta)
+    for start in range(0, len(deltas), SHOPPING_LIST_CHUNK_SIZE):
+        chunk = deltas[start:start + SHOPPING_LIST_CHUNK_SIZE]
+        increments = {key: delta for key, delta in chunk if delta > 0}
+        decrements = {key: -delta for key, delta in chunk if delta < 0}
+        if increments:
+            add_shopping_list_amounts(increments)
+        if decrements:
+            subtract_shopping_list_amounts(decrements)
+
+
+def recipe_amounts(recipe):
+    amounts = defaultdict(int)
+    for ingredient, amount in IngredientsForRecipes.objects.filter(
+            recipe=recipe).values_list('ingredient', 'amount'):
+        amounts[ingredient] += amount
+    return amounts
+
+
+def add_to_shopping_list(author_id, recipe_id, sign=1):
+    """Добавляет ингредиенты рецепта в список покупок пользователя."""
+    apply_shopping_list_deltas({
+        (author_id, ingredient): sign * amount
+        for ingredient, amount in recipe_amounts(recipe_id).items()})
+
+
+def remove_from_shopping_list(author_id, recipe_id):
+    add_to_shopping_list(author_id, recipe_id, sign=-1)
+
+
+@contextmanager
+def tracking_shopping_lists(recipes):
+    """
+    Переносит в списки покупок изменения состава рецептов recipes,
+    сделанные внутри блока любым способом: сериализатором, в админке.
+    """
+    with transaction.atomic(savepoint=False):
+        old_amounts = {recipe: recipe_amounts(recipe) for recipe in recipes}
+        yield
+        for recipe, amounts in old_amounts.items():
+            update_shopping_lists(recipe, amounts, recipe_amounts(recipe))
+
+
+def update_shopping_lists(recipe, old_amounts, new_amounts):
+    """
+    Переносит изменение ингредиентов рецепта в списки покупок
+    всех пользователей, у которых рецепт лежит в корзине.
+    """
+    changes = {
+        ingredient: new_amounts.get(ingredient, 0) - old_amounts.get(
+            ingredient, 0)
+        for ingredient in old_amounts.keys() | new_amounts.keys()}
+    holders = ShoppingCart.objects.filter(recipe=recipe).values(
+        'author').annotate(times=Count('id')).order_by()
+    apply_shopping_list_deltas({
+        (holder['author'], ingredient): change * holder['times']
+        for holder in holders
+        for ingredient, change in changes.items()})
+
+
+COUNTERS = {
+    Recipes: {'favorites_count': (Favorites, 'recipe'),
+              'in_carts_count': (ShoppingCart, 'recipe')},
+    User: {'recipes_count': (Recipes, 'author'),
+           'followers_count': (Follow, 'author')},
+}
+
+
+def change_counters(queryset, field, delta=1):
+    """Атомарно меняет счётчики в базе на delta, не опуская их ниже нуля."""
+    queryset.update(**{field: Greatest(F(field) + delta, Value(0))})
+
+
+def change_counter(instance, field, delta=1):
+    change_counters(type(instance).objects.filter(pk=instance.pk),
+                    field, delta)
+
+
+def count_of(model, field):
+    """Подзапрос с числом строк model, ссылающихся на объект через field."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')), 0)
+
+
+def actual_counters(model):
+    return {field: count_of(*source)
+            for field, source in COUNTERS[model].items()}
+
+
+def refresh_counters(queryset):
+    """Пересчитывает все счётчики объектов queryset одним запросом."""
+    queryset.update(**actual_counters(queryset.model))
+
+
+def shopping_list_txt(ingredients, today):
+    yield f'Список покупок на: {today}\n\n'
+    for ingredient in ingredients:
+        yield (
             f'{ingredient["ingredient__name"]} - '
             f'{ingredient["amounts"]} '
             f'{ingredient["ingredient__measurement_unit"]}\n'
         )
-    shopping_list += '\n\nFoodgram'
-    filename = 'shopping_list.txt'
-    response = HttpResponse(shopping_list, content_type='text/plain')
+    yield '\n\nFoodgram'
+
+
+def shopping_list_csv(ingredients, today):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for ingredient in ingredients:
+        yield writer.writerow((ingredient['ingredient__name'],
+                               ingredient['amounts'],
+                               ingredient['ingredient__measurement_unit']))
+
+
+def shopping_list_json(ingredients, today):
+    yield f'{{"date": "{today}", "ingredients": ['
+    separator = ''
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'amount': ingredient['amounts'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+        }, ensure_ascii=False)
+        separator = ', '
+    yield ']}'
+
+
+def shopping_list_pdf(ingredients, today):
+    """
+    PDF собирается целиком до отдачи, поэтому пишется во временный файл,
+    который переносится на диск после первого мегабайта.
+    """
+    if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT))
+    with SpooledTemporaryFile(max_size=2 ** 20) as buffer:
+        canvas = Canvas(buffer, pagesize=A4)
+        _, height = A4
+        y = 0
+        for line in shopping_list_txt(ingredients, today):
+            for text in line.splitlines() or ['']:
+                if y < PDF_MARGIN:
+                    if y:
+                        canvas.showPage()
+                    canvas.setFont(PDF_FONT_NAME, PDF_FONT_SIZE)
+                    y = height - PDF_MARGIN
+                canvas.drawString(PDF_MARGIN, y, text)
+                y -= PDF_LINE_HEIGHT
+        canvas.save()
+        buffer.seek(0)
+        while True:
+            chunk = buffer.read(2 ** 16)
+            if not chunk:
+                break
+            yield chunk
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (shopping_list_txt, 'text/plain; charset=utf-8'),
+    'csv': (shopping_list_csv, 'text/csv; charset=utf-8'),
+    'json': (shopping_list_json, 'application/json'),
+    'pdf': (shopping_list_pdf, 'application/pdf'),
+}
+
+
+def shopping_cart(self, request, author):
+    """Загрузка рецепта из корзины с выбранными рецептами."""
+    file_format = request.accepted_renderer.format
+    renderer, content_type = SHOPPING_LIST_FORMATS[file_format]
+    today = date.today().strftime("%d-%m-%Y")
+    response = StreamingHttpResponse(
+        renderer(get_shopping_list(author), today),
+        content_type=content_type)
+    filename = f'shopping_list.{file_format}'
     response['Content-Disposition'] = f'attachment; filename={filename}'
     return response
@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from api.caching import (bump_authors_version, bump_catalog_version,
+                         bump_recipe_version,
+                         record_recipe_ingredients_change)
+from api.services import add_to_shopping_list, remove_from_shopping_list
+from recipes.models import (Favorites, Ingredients, RecipePopularity,
+                            Recipes, ShoppingCart, Tags)
+from recipes.popularity import initial_popularity
+from users.models import User
+
+
+@receiver((post_save, post_delete), sender=Ingredients)
+@receiver((post_save, post_delete), sender=Tags)
+def catalog_changed(**kwargs):
+    bump_catalog_version()
+
+
+@receiver((post_save, post_delete), sender=Recipes)
+def recipe_changed(instance, update_fields=None, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: bump_recipe_version(pk))
+    # Полное сохранение (RecipeWriteSerializer, админка) и удаление могут
+    # менять состав рецепта: ингредиенты записываются в той же транзакции.
+    if update_fields is None:
+        transaction.on_commit(lambda: record_recipe_ingredients_change(pk))
+
+
+@receiver(post_save, sender=Recipes)
+def recipe_created(instance, created, raw=False, **kwargs):
+    # Новый рецепт сразу попадает в ленту популярных, не дожидаясь
+    # refresh_popularity.
+    if created and not raw:
+        RecipePopularity.objects.create(
+            recipe=instance, score=initial_popularity(instance))
+
+
+@receiver(post_delete, sender=Favorites)
+@receiver(post_delete, sender=ShoppingCart)
+def popularity_event_removed(instance, **kwargs):
+    # Удалённую запись нельзя найти по created: refresh_popularity
+    # пересчитает рецепт по сброшенному refreshed.
+    RecipePopularity.objects.filter(recipe_id=instance.recipe_id).update(
+        refreshed=None)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_item_added(instance, created, raw=False, **kwargs):
+    if created and not raw:
+        add_to_shopping_list(instance.author_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def cart_item_removed(instance, **kwargs):
+    # До удаления: при каскаде от рецепта или пользователя его ингредиенты
+    # и строки списка покупок ещё на месте. Так список остаётся верным при
+    # удалении из админки, через ORM и каскадом; массовые операции без
+    # сигналов (bulk_create, update) исправляет rebuild_shopping_lists.
+    remove_from_shopping_list(instance.author_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=User)
+def author_changed(update_fields, **kwargs):
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        transaction.on_commit(bump_authors_version)
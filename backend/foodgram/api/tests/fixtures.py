@@ -0,0 +1,18 @@
+from recipes.models import IngredientsForRecipes, Recipes
+from users.models import User
+
+
+def make_user(name, **extra):
+    return User.objects.create_user(
+        username=name, email=f'{name}@example.com', password='pass-word-1',
+        first_name=name, last_name=name, **extra)
+
+
+def make_recipe(author, name, amounts):
+    recipe = Recipes.objects.create(author=author, name=name, text=name,
+                                    cooking_time=10, image='recipes/x.png')
+    IngredientsForRecipes.objects.bulk_create(
+        IngredientsForRecipes(recipe=recipe, ingredient=ingredient,
+                              amount=amount)
+        for ingredient, amount in amounts.items())
+    return recipe
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from api.caching import (CATALOG_VERSION_KEY, bump_catalog_version,
+                         get_version, recent_versions)
+
+
+class VersionCacheTests(SimpleTestCase):
+
+    def test_versions_survive_culling_of_responses(self):
+        bump_catalog_version()
+        version = get_version(CATALOG_VERSION_KEY)
+        max_entries = settings.CACHES['default']['OPTIONS']['MAX_ENTRIES']
+        cache.set_many({f'response:{number}': number
+                        for number in range(max_entries + 1)}, 60)
+        cache.clear()
+        recent_versions.clear()
+        self.assertEqual(get_version(CATALOG_VERSION_KEY), version)
@@ -0,0 +1,37 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from recipes.models import Ingredients
+
+
+class IngredientSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredients.objects.bulk_create(
+            Ingredients(name=name, measurement_unit='г') for name in (
+                *(f'Сыр {number:02}' for number in range(30, 0, -1)),
+                'Сырок', 'Масло'))
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, path, name):
+        response = self.client.get(path, {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_index_and_database_return_the_same(self):
+        for path in ('/api/ingredients/', '/api/async/ingredients/'):
+            with self.subTest(path=path):
+                indexed = self.search(path, 'Сыр')
+                cache.clear()
+                with mock.patch('api.search.ingredient_index.get_index',
+                                return_value=None):
+                    fallback = self.search(path, 'Сыр')
+                self.assertEqual(len(indexed), 31)
+                self.assertEqual(indexed, fallback)
+                self.assertEqual(
+                    indexed, sorted(indexed, key=lambda item: item['id']))
@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from api.caching import RECIPE_INGREDIENTS_VERSION_KEY, bump_version
+from api.tests.fixtures import make_recipe, make_user
+from recipes.models import Ingredients
+
+
+class RecipeMatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = make_user('cook')
+        cls.cheese, cls.eggs, cls.milk, cls.salt = (
+            Ingredients.objects.bulk_create(
+                Ingredients(name=name, measurement_unit='г')
+                for name in ('сыр', 'яйца', 'молоко', 'соль')))
+        cls.omelette = make_recipe(author, 'Омлет',
+                                   {cls.eggs: 3, cls.milk: 100})
+        cls.quiche = make_recipe(author, 'Киш', {
+            cls.cheese: 100, cls.eggs: 2, cls.milk: 50, cls.salt: 5})
+        cls.toast = make_recipe(author, 'Тост', {cls.cheese: 50,
+                                                 cls.salt: 1})
+        cls.fried = make_recipe(author, 'Глазунья', {cls.eggs: 2,
+                                                     cls.salt: 1})
+        cls.soup = make_recipe(author, 'Суп', {cls.salt: 5})
+
+    def setUp(self):
+        # Составы записаны в обход сигналов: индекс в памяти процесса
+        # перестраивается целиком.
+        bump_version(RECIPE_INGREDIENTS_VERSION_KEY)
+        self.admin = make_user('admin', is_staff=True, is_superuser=True)
+
+    def match(self, *ingredients, **params):
+        response = self.client.get('/api/recipes/by_ingredients/', {
+            'ingredients': [ingredient.pk for ingredient in ingredients],
+            **params})
+        self.assertEqual(response.status_code, 200)
+        return [(recipe['id'], recipe['matched_ingredients'],
+                 recipe['missing_ingredients'])
+                for recipe in response.json()['results']]
+
+    def test_ranked_by_share_then_missing_then_newest(self):
+        self.assertEqual(self.match(self.eggs, self.milk), [
+            (self.omelette.pk, 2, 0),
+            # Доля 1/2 у обоих: новый рецепт выше.
+            (self.fried.pk, 1, 1),
+            (self.quiche.pk, 2, 2),
+        ])
+
+    def test_max_missing(self):
+        self.assertEqual(
+            self.match(self.eggs, self.milk, self.cheese, max_missing=1),
+            [(self.omelette.pk, 2, 0), (self.quiche.pk, 3, 1),
+             (self.fried.pk, 1, 1), (self.toast.pk, 1, 1)])
+
+    def test_database_fallback_matches_index(self):
+        ingredients = (self.eggs, self.salt)
+        indexed = self.match(*ingredients)
+        with mock.patch('api.search.recipe_ingredient_index.get_index',
+                        return_value=None):
+            self.assertEqual(self.match(*ingredients), indexed)
+
+    def test_admin_composition_change_updates_index(self):
+        self.assertEqual(self.match(self.milk), [
+            (self.omelette.pk, 1, 1), (self.quiche.pk, 1, 3)])
+        row = self.toast.recipes_ingredients.get(ingredient=self.cheese)
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/admin/recipes/ingredientsforrecipes/{row.pk}/change/',
+                {'recipe': self.toast.pk, 'ingredient': self.milk.pk,
+                 'amount': 30})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.match(self.milk), [
+            (self.toast.pk, 1, 1), (self.omelette.pk, 1, 1),
+            (self.quiche.pk, 1, 3)])
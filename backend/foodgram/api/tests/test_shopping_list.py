@@ -0,0 +1,140 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.services import apply_shopping_list_deltas, calculate_shopping_lists
+from api.tests.fixtures import make_recipe, make_user
+from recipes.models import (Ingredients, Recipes, ShoppingCart,
+                            ShoppingListItem, Tags)
+from users.models import User
+
+
+class ShoppingListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('buyer')
+        cls.other = make_user('other')
+        cls.salt, cls.flour, cls.milk = Ingredients.objects.bulk_create(
+            Ingredients(name=name, measurement_unit='г')
+            for name in ('соль', 'мука', 'молоко'))
+        cls.tag = Tags.objects.create(name='Завтрак', color='#111111',
+                                      slug='breakfast')
+        cls.bread = make_recipe(cls.other, 'Хлеб',
+                                {cls.salt: 5, cls.flour: 500})
+        cls.pancakes = make_recipe(cls.other, 'Блины',
+                                   {cls.flour: 200, cls.milk: 300})
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stored(self, user=None):
+        return dict(ShoppingListItem.objects.filter(
+            author=user or self.user).values_list('ingredient', 'amount'))
+
+    def assertConsistent(self):
+        """Сохранённые суммы совпадают с пересчитанными по корзинам."""
+        expected = calculate_shopping_lists(User.objects.values('id'))
+        stored = {(item.author_id, item.ingredient_id): item.amount
+                  for item in ShoppingListItem.objects.all()}
+        self.assertEqual(stored, expected)
+
+    def test_cart_actions_sum_shared_ingredients(self):
+        for recipe in (self.bread, self.pancakes):
+            response = self.client.post(
+                f'/api/recipes/{recipe.pk}/shopping_cart/')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stored(), {self.salt.pk: 5,
+                                         self.flour.pk: 700,
+                                         self.milk.pk: 300})
+        response = self.client.delete(
+            f'/api/recipes/{self.bread.pk}/shopping_cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.stored(), {self.flour.pk: 200,
+                                         self.milk.pk: 300})
+        self.assertConsistent()
+
+    def test_insert_adds_to_row_created_concurrently(self):
+        # Другой запрос успел вставить строку: вставка складывает
+        # количества, а не падает на уникальном ограничении.
+        ShoppingListItem.objects.create(author=self.user,
+                                        ingredient=self.flour, amount=200)
+        apply_shopping_list_deltas({(self.user.pk, self.flour.pk): 500,
+                                    (self.user.pk, self.salt.pk): 5})
+        self.assertEqual(self.stored(), {self.flour.pk: 700,
+                                         self.salt.pk: 5})
+
+    def test_decrement_touches_only_given_keys(self):
+        for user, ingredient in ((self.user, self.flour),
+                                 (self.user, self.milk),
+                                 (self.other, self.flour),
+                                 (self.other, self.milk)):
+            ShoppingListItem.objects.create(author=user,
+                                            ingredient=ingredient, amount=10)
+        apply_shopping_list_deltas({(self.user.pk, self.flour.pk): -10,
+                                    (self.other.pk, self.milk.pk): -4})
+        self.assertEqual(self.stored(), {self.milk.pk: 10})
+        self.assertEqual(self.stored(self.other),
+                         {self.flour.pk: 10, self.milk.pk: 6})
+
+    def test_orm_and_cascade_deletes(self):
+        third = make_user('third')
+        for user in (self.user, third):
+            for recipe in (self.bread, self.pancakes):
+                ShoppingCart.objects.create(author=user, recipe=recipe)
+        self.assertConsistent()
+        ShoppingCart.objects.filter(author=third, recipe=self.bread).delete()
+        self.assertConsistent()
+        self.pancakes.delete()
+        self.assertConsistent()
+        self.assertEqual(self.stored(), {self.salt.pk: 5,
+                                         self.flour.pk: 500})
+        third.delete()
+        self.assertConsistent()
+
+    def test_recipe_update_changes_lists(self):
+        ShoppingCart.objects.create(author=self.user, recipe=self.bread)
+        self.client.force_authenticate(self.other)
+        response = self.client.patch(
+            f'/api/recipes/{self.bread.pk}/',
+            {'ingredients': [{'id': self.flour.pk, 'amount': 450},
+                             {'id': self.milk.pk, 'amount': 50}],
+             'tags': [self.tag.pk], 'name': 'Хлеб', 'text': 'Хлеб',
+             'cooking_time': 10}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.stored(), {self.flour.pk: 450,
+                                         self.milk.pk: 50})
+        self.assertConsistent()
+
+    def test_admin_ingredient_changes_update_lists(self):
+        ShoppingCart.objects.create(author=self.user, recipe=self.bread)
+        admin = make_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        row = self.bread.recipes_ingredients.get(ingredient=self.flour)
+        response = self.client.post(
+            f'/admin/recipes/ingredientsforrecipes/{row.pk}/change/',
+            {'recipe': self.pancakes.pk, 'ingredient': self.flour.pk,
+             'amount': 300})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stored(), {self.salt.pk: 5})
+        ShoppingCart.objects.create(author=self.user, recipe=self.pancakes)
+        salt = self.bread.recipes_ingredients.get(ingredient=self.salt)
+        response = self.client.post(
+            f'/admin/recipes/ingredientsforrecipes/{salt.pk}/delete/',
+            {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stored(), {self.flour.pk: 500,
+                                         self.milk.pk: 300})
+        self.assertConsistent()
+
+    def test_cart_and_favorite_return_absolute_image_urls(self):
+        Recipes.objects.filter(pk=self.bread.pk).update(image_variants={
+            'thumbnail': {'width': 160, 'webp': 'recipes/variants/1.webp',
+                          'jpeg': 'recipes/variants/1.jpg'}})
+        for action in ('shopping_cart', 'favorite'):
+            response = self.client.post(
+                f'/api/recipes/{self.bread.pk}/{action}/')
+            self.assertEqual(response.status_code, 201)
+            self.assertTrue(response.data['image'].startswith('http://'))
+            self.assertTrue(response.data['images']['thumbnail'][
+                'webp'].startswith('http://testserver/'))
@@ -0,0 +1,44 @@
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core.constants import IMAGE_MAX_UPLOAD_SIZE
+
+# Запас на остальные поля формы и разделители multipart.
+FORM_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = (
+        f'Размер файла не должен превышать '
+        f'{IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)} МБ.')
+    default_code = 'upload_too_large'
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пишет загружаемый файл сразу во временный файл на диске, не держа его
+    в памяти, и прерывает загрузку, как только превышен допустимый размер.
+    """
+
+    def __init__(self, request=None, max_size=IMAGE_MAX_UPLOAD_SIZE):
+        super().__init__(request)
+        self.max_size = max_size
+        self.received = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        if content_length > self.max_size + FORM_OVERHEAD:
+            raise UploadTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        self.received = 0
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.file.close()
+            raise UploadTooLarge()
+        return super().receive_data_chunk(raw_data, start)
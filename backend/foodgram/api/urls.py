@@ -1,7 +1,9 @@
 from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientsViewSet, RecipesViewSet, TagsViewSet, UserViewSet
+from . import async_views
+from .views import (IngredientsViewSet, MetricsView, RecipesViewSet,
+                    TagsViewSet, UserViewSet)
 
 
 router = DefaultRouter()
@@ -10,8 +12,20 @@ router.register('tags', TagsViewSet)
 router.register('ingredients', IngredientsViewSet)
 router.register('recipes', RecipesViewSet)
 
+async_urlpatterns = [
+    path('recipes/', async_views.recipe_list, name='async-recipes-list'),
+    path('recipes/<int:pk>/', async_views.recipe_detail,
+         name='async-recipes-detail'),
+    path('tags/', async_views.tag_list, name='async-tags-list'),
+    path('ingredients/', async_views.ingredient_list,
+         name='async-ingredients-list'),
+    path('users/subscriptions/', async_views.subscriptions,
+         name='async-users-subscriptions'),
+]
 
 urlpatterns = [
+    path('async/', include(async_urlpatterns)),
+    re_path(r'^_metrics/?$', MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
     re_path(r'auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,41 +1,63 @@
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from djoser.serializers import SetPasswordSerializer
-from recipes.models import Favorites, Ingredients, Recipes, ShoppingCart, Tags
+from jobs.queue import enqueue
+from recipes.models import (Favorites, Ingredients, IngredientsForRecipes,
+                            Recipes, ShoppingCart, Tags)
+from recipes.tasks import delete_recipe_image_variants
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated, SAFE_METHODS
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from api.caching import CatalogCacheMixin, RecipeCacheMixin
+from api.feed import (RecipeFeedMixin, build_recipes, feed_queryset,
+                      recipe_rows)
 from api.filters import IngredientFilter, RecipeFilter
-from api.paginations import ApiPagination
-from api.permissions import AdminOrOwner, OwnerUserOrReadOnly
+from api.paginations import ApiPagination, RecipePagination
+from api.permissions import AdminOrOwner, IsAdmin, OwnerUserOrReadOnly
+from api.renderers import (CSVRenderer, FastJSONRenderer, PDFRenderer,
+                           PrometheusRenderer, TextRenderer)
+from api.search import IngredientSearchMixin, match_recipes
+from api.uploads import LimitedTemporaryFileUploadHandler
 from api.serializers import (
     FavoriteSerializer,
     IngredientSerializer,
     RecipeListSerializer,
+    RecipeMatchQuerySerializer,
     RecipeWriteSerializer,
     ShoppingCartSerializer,
     TagsSerializer,
     UserSerializer,
     FollowSerializer,
 )
-from api.services import shopping_cart
+from api.services import change_counter, shopping_cart
+from foodgram.metrics import registry, render_prometheus
 from users.models import Follow, User
 
 
-class IngredientsViewSet(mixins.ListModelMixin,
+class IngredientsViewSet(CatalogCacheMixin,
+                         IngredientSearchMixin,
+                         mixins.ListModelMixin,
                          mixins.RetrieveModelMixin,
                          viewsets.GenericViewSet):
     """Вьюсет моедли ингридиентов."""
     queryset = Ingredients.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny, )
+    read_from_replica = True
     filter_backends = (IngredientFilter, )
     search_fields = ('^name',)
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(RecipeCacheMixin, RecipeFeedMixin,
+                     viewsets.ModelViewSet):
     """
     Вьюсет модели Recipes.
     Позволяет получить, добавить или удалить рецепт из списка покупок и
@@ -44,75 +66,138 @@ class RecipesViewSet(viewsets.ModelViewSet):
     """
     queryset = Recipes.objects.all()
     filter_backends = (DjangoFilterBackend, )
-    pagination_class = ApiPagination
+    pagination_class = RecipePagination
     filterset_class = RecipeFilter
     permission_classes = (AdminOrOwner, )
+    read_from_replica = True
+    parser_classes = (JSONParser, MultiPartParser)
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [LimitedTemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def get_queryset(self):
+        if self.request.method not in SAFE_METHODS:
+            return Recipes.objects.all()
+        return feed_queryset(self.request.user).prefetch_related(
+            Prefetch('tags', queryset=Tags.objects.order_by('id')),
+            Prefetch('recipes_ingredients',
+                     queryset=IngredientsForRecipes.objects.select_related(
+                         'ingredient').order_by('id')))
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeListSerializer
         return RecipeWriteSerializer
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        variants = instance.image_variants
+        instance.delete()
+        change_counter(instance.author, 'recipes_count', -1)
+        enqueue(delete_recipe_image_variants, variants=variants)
+
     @action(detail=True,
             methods=['POST'],
             permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def shopping_cart(self, request, **kwargs):
         recipe = get_object_or_404(Recipes, id=self.kwargs.get('pk'))
         user = self.request.user
         serializer = ShoppingCartSerializer(data=request.data,
-                                            context={'user': user,
+                                            context={'request': request,
+                                                     'user': user,
                                                      'recipe': recipe})
         serializer.is_valid(raise_exception=True)
         serializer.save(author=user, recipe=recipe)
+        change_counter(recipe, 'in_carts_count')
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @shopping_cart.mapping.delete
+    @transaction.atomic
     def shopping_cart_delete(self, request, **kwargs):
+        recipe = get_object_or_404(Recipes, id=self.kwargs.get('pk'))
         get_object_or_404(ShoppingCart, author=request.user,
-                          recipe=get_object_or_404(
-                              Recipes, id=self.kwargs.get('pk'))).delete()
+                          recipe=recipe).delete()
+        change_counter(recipe, 'in_carts_count', -1)
         return Response('Рецепт удалён из списка покупок',
                         status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True,
             methods=['POST'],
             permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def favorite(self, request, *args, **kwargs):
         recipe = get_object_or_404(Recipes, id=self.kwargs.get('pk'))
         user = self.request.user
         serializer = FavoriteSerializer(data=request.data,
-                                        context={'user': user,
+                                        context={'request': request,
+                                                 'user': user,
                                                  'recipe': recipe})
         serializer.is_valid(raise_exception=True)
         serializer.save(author=user, recipe=recipe)
+        change_counter(recipe, 'favorites_count')
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @favorite.mapping.delete
+    @transaction.atomic
     def favorite_delete(self, request, *args, **kwargs):
+        recipe = get_object_or_404(Recipes, id=self.kwargs.get('pk'))
         get_object_or_404(Favorites, author=request.user,
-                          recipe=get_object_or_404(
-                              Recipes, id=self.kwargs.get('pk'))).delete()
+                          recipe=recipe).delete()
+        change_counter(recipe, 'favorites_count', -1)
         return Response('Рецепт успешно удалён из избранного.',
                         status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=['get'])
+    def by_ingredients(self, request):
+        """
+        Рецепты, которые можно приготовить из указанных ингредиентов:
+        сначала те, где их доля в составе больше. max_missing оставляет
+        рецепты, для которых докупить нужно не больше указанного числа.
+        """
+        query = RecipeMatchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        paginator = ApiPagination()
+        page = paginator.paginate_queryset(
+            match_recipes(**query.validated_data), request, view=self)
+        recipes = {recipe['id']: recipe for recipe in build_recipes(
+            recipe_rows(feed_queryset(request.user).filter(
+                id__in=[pk for pk, _, _ in page])), request)}
+        return paginator.get_paginated_response([
+            {**recipes[pk], 'matched_ingredients': matched,
+             'missing_ingredients': missing}
+            for pk, matched, missing in page if pk in recipes])
+
     @action(detail=False,
             methods=['get'],
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[TextRenderer, CSVRenderer, JSONRenderer,
+                              PDFRenderer])
     def download_shopping_cart(self, request):
         author = User.objects.get(id=self.request.user.pk)
         if author.shopping_cart.exists():
             return shopping_cart(self, request, author)
-        return Response('Список покупок пуст.',
+        message = 'Список покупок пуст.'
+        if request.accepted_renderer.format == TextRenderer.format:
+            return Response(message, status=status.HTTP_404_NOT_FOUND)
+        # Ошибку нельзя отдать как PDF или CSV: она уходит в JSON.
+        request.accepted_renderer = JSONRenderer()
+        request.accepted_media_type = JSONRenderer.media_type
+        return Response({'detail': message},
                         status=status.HTTP_404_NOT_FOUND)
 
 
-class TagsViewSet(mixins.ListModelMixin,
+class TagsViewSet(CatalogCacheMixin,
+                  mixins.ListModelMixin,
                   mixins.RetrieveModelMixin,
                   viewsets.GenericViewSet):
     """Вьюсет для тегов."""
     queryset = Tags.objects.all()
     serializer_class = TagsSerializer
     permission_classes = (AllowAny, )
+    read_from_replica = True
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -124,6 +209,7 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = (OwnerUserOrReadOnly, )
+    read_from_replica = True
     pagination_class = ApiPagination
 
     @action(detail=False, methods=['GET'],
@@ -146,6 +232,7 @@ class UserViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['POST'],
             permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def subscribe(self, request, *args, **kwargs):
         author = get_object_or_404(User, id=self.kwargs.get('pk'))
         user = self.request.user
@@ -154,23 +241,47 @@ class UserViewSet(viewsets.ModelViewSet):
                                                'author': author})
         serializer.is_valid(raise_exception=True)
         serializer.save(author=author, user=user)
+        change_counter(author, 'followers_count')
         return Response({'Подписка успешно создана': serializer.data},
                         status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
+    @transaction.atomic
     def subscribe_delete(self, request, *args, **kwargs):
-        get_object_or_404(Follow, user=request.user,
-                          author=get_object_or_404(
-                              User, id=self.kwargs.get('pk'))).delete()
+        author = get_object_or_404(User, id=self.kwargs.get('pk'))
+        get_object_or_404(Follow, user=request.user, author=author).delete()
+        change_counter(author, 'followers_count', -1)
         return Response('Успешная отписка',
                         status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['GET'],
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        follows = Follow.objects.filter(user=self.request.user)
+        recipes = Recipes.objects.only(
+            'id', 'name', 'image', 'image_variants', 'cooking_time', 'author')
+        limit = request.query_params.get('recipes_limit')
+        if limit and limit.isdigit():
+            recipes = recipes.annotate(row_number=Window(
+                RowNumber(), partition_by=F('author'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )).filter(row_number__lte=int(limit))
+        follows = Follow.objects.filter(
+            user=self.request.user
+        ).select_related('author').prefetch_related(
+            Prefetch('author__recipes', queryset=recipes,
+                     to_attr='limited_recipes')
+        ).order_by('-id')
         pages = self.paginate_queryset(follows)
         serializer = FollowSerializer(pages,
                                       many=True,
                                       context={'request': request})
         return self.get_paginated_response(serializer.data)
+
+
+class MetricsView(APIView):
+    """Гистограммы производительности запросов для Prometheus."""
+    permission_classes = (IsAdmin, )
+    renderer_classes = (PrometheusRenderer, )
+
+    def get(self, request):
+        return Response(render_prometheus(registry.collect()))
@@ -8,3 +8,45 @@ ROLE_MAX_LENGHT = 15
 COLOR_MAX_LENGHT = 30
 SLUG_MAX_LENGHT = 150
 CHAR_FIELD_MAX_LENGTH = 150
+SHOPPING_LIST_CHUNK_SIZE = 500
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 16
+PDF_MARGIN = 50
+INGREDIENT_INDEX_MAX_SIZE = 100000
+RECIPE_INGREDIENT_INDEX_MAX_SIZE = 2_000_000
+RECIPE_INGREDIENT_CHANGES_MAX = 1000
+RECIPE_INGREDIENT_CHANGES_TIMEOUT = 60 * 60
+RECIPE_INGREDIENT_CHANGES_ATTEMPTS = 5
+RECIPE_MATCH_MAX_INGREDIENTS = 100
+CATALOG_CACHE_MAX_AGE = 60
+CACHE_VERSION_MAX_AGE = 1
+CACHE_VERSION_MAX_KEYS = 10000
+CATALOG_CACHE_TIMEOUT = 60 * 60
+IMAGE_VARIANTS = {'thumbnail': 160, 'card': 480, 'full': 1280}
+IMAGE_VARIANTS_DIR = 'recipes/variants'
+IMAGE_WEBP_QUALITY = 80
+IMAGE_JPEG_QUALITY = 82
+IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40_000_000
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_DELAY = 10
+JOBS_LOCK_TIMEOUT = 10 * 60
+JOBS_POLL_INTERVAL = 1
+JOBS_HEARTBEAT_INTERVAL = 60
+JOBS_RETENTION = 7 * 24 * 60 * 60
+JOBS_PURGE_INTERVAL = 60 * 60
+JOBS_PURGE_BATCH_SIZE = 1000
+ADMIN_LIST_PER_PAGE = 50
+ADMIN_ESTIMATE_THRESHOLD = 100000
+RECIPES_CACHE_TIMEOUT = 5 * 60
+REPLICA_PIN_SECONDS = 10
+METRICS_FLUSH_INTERVAL = 10
+METRICS_SNAPSHOT_TIMEOUT = 60 * 60
+METRICS_MAX_PROCESSES = 256
+METRICS_N_PLUS_ONE_REPEATS = 5
+POPULARITY_EPOCH = 1704067200
+POPULARITY_HALF_LIFE = 7 * 24 * 60 * 60
+POPULARITY_PUBLISH_WEIGHT = 1
+POPULARITY_FAVORITE_WEIGHT = 2
+POPULARITY_CART_WEIGHT = 3
+POPULARITY_REFRESH_CHUNK_SIZE = 500
@@ -0,0 +1,137 @@
+"""
+Чтение с реплик базы данных. Безопасные запросы к вьюсетам с атрибутом
+read_from_replica читают с реплик, всё остальное идёт в основную базу.
+После записи клиент на REPLICA_PIN_SECONDS закрепляется за основной
+базой, чтобы сразу увидеть свои изменения несмотря на отставание реплик.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from hashlib import md5
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from core.constants import REPLICA_PIN_SECONDS
+
+use_replica = ContextVar('use_replica', default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Включает или выключает чтение с реплик внутри блока."""
+    token = use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        use_replica.reset(token)
+
+
+class ReplicaRouter:
+    """Роутер: чтение с реплики, если оно включено, запись в основную."""
+    # Токены и сессии создаются прямо перед чтением, отставание реплики
+    # для них недопустимо. Так же и для кэша в базе: в нём версии данных.
+    primary_models = {'authtoken.token', 'sessions.session',
+                      'django_cache.cacheentry'}
+
+    def db_for_read(self, model, **hints):
+        label = f'{model._meta.app_label}.{model._meta.model_name}'
+        if (not settings.REPLICA_DATABASES or not use_replica.get()
+                or label in self.primary_models
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        # Объекты, прочитанные с реплики, сохраняются в основную базу.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+def pin_key(request):
+    """
+    Ключ клиента: токен или сессия. Анонимы не закрепляются: за nginx
+    у всех них один адрес, и регистрация одного закрепляла бы всех.
+    """
+    client = (request.headers.get('Authorization')
+              or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    if not client:
+        return None
+    return 'db:primary:' + md5(client.encode()).hexdigest()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Включает чтение с реплик для безопасных запросов к вьюсетам с
+    read_from_replica = True и закрепляет клиента за основной базой
+    после успешной записи. Работает и под WSGI, и под ASGI без
+    переключения цепочки middleware в синхронный режим.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.restore(request)
+        key = self.pin(request, response)
+        if key is not None:
+            cache.set(key, True, REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.restore(request)
+        key = self.pin(request, response)
+        if key is not None:
+            await cache.aset(key, True, REPLICA_PIN_SECONDS)
+        return response
+
+    @staticmethod
+    def restore(request):
+        # Под ASGI синхронный process_view выполняется в потоке, и токен
+        # ContextVar создан в другом контексте: значение возвращается set.
+        if hasattr(request, 'replica_previous'):
+            use_replica.set(request.replica_previous)
+
+    @staticmethod
+    def pin(request, response):
+        """Ключ закрепления клиента после успешной записи или None."""
+        if (settings.REPLICA_DATABASES
+                and request.method not in SAFE_METHODS
+                and response.status_code < 400):
+            return pin_key(request)
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if (settings.REPLICA_DATABASES
+                and request.method in SAFE_METHODS
+                and getattr(view_class, 'read_from_replica', False)):
+            key = pin_key(request)
+            if key is None or not cache.get(key):
+                request.replica_previous = use_replica.get()
+                use_replica.set(True)
@@ -0,0 +1,317 @@
+"""
+Метрики производительности запросов. MetricsMiddleware для каждого
+запроса считает число и время SQL-запросов, время представления за
+вычетом SQL (весь его Python-код: права, фильтры, сериализаторы, сборка
+ответа) и рендеринга, отдаёт их в заголовке Server-Timing и копит
+гистограммы по представлениям.
+SQL-запросы записываются обёрткой на каждом соединении в QueryRecorder
+текущего запроса из ContextVar: под ASGI представление и асинхронный
+ORM работают в других потоках, со своими соединениями.
+Гистограммы каждого процесса периодически сохраняются в общий кэш
+в слот процесса со сроком жизни, эндпоинт /api/_metrics отдаёт сумму
+живых слотов в формате Prometheus.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from core.constants import (METRICS_FLUSH_INTERVAL, METRICS_MAX_PROCESSES,
+                            METRICS_N_PLUS_ONE_REPEATS,
+                            METRICS_SNAPSHOT_TIMEOUT)
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+HISTOGRAMS = {
+    'foodgram_request_duration_seconds': (
+        'Полное время обработки запроса.', DURATION_BUCKETS),
+    'foodgram_sql_duration_seconds': (
+        'Суммарное время SQL-запросов за запрос.', DURATION_BUCKETS),
+    'foodgram_view_minus_sql_duration_seconds': (
+        'Время представления за вычетом SQL: права, фильтры, сериализаторы '
+        'и сборка ответа вместе.', DURATION_BUCKETS),
+    'foodgram_render_duration_seconds': (
+        'Время рендеринга ответа.', DURATION_BUCKETS),
+    'foodgram_sql_queries': ('Число SQL-запросов за запрос.', QUERY_BUCKETS),
+}
+COUNTERS = {
+    'foodgram_n_plus_one_suspects_total': (
+        'Запросы, в которых один SQL повторялся подозрительно часто.'),
+}
+
+
+def slot_key(slot):
+    return f'metrics:slot:{slot}'
+
+
+def process_name():
+    # pid повторяются в разных контейнерах, поэтому вместе с хостом.
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class Registry:
+    """
+    Гистограммы и счётчики процесса с меткой view. Значение гистограммы
+    хранится списком: счётчики корзин, затем сумма и число наблюдений.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {name: {} for name in (*HISTOGRAMS, *COUNTERS)}
+        self.flushed = 0.0
+        self.slot = None
+
+    def observe(self, view, histograms, counters):
+        with self.lock:
+            for name, value in histograms.items():
+                buckets = HISTOGRAMS[name][1]
+                series = self.values[name].setdefault(
+                    view, [0] * (len(buckets) + 2))
+                position = bisect_left(buckets, value)
+                if position < len(buckets):
+                    series[position] += 1
+                series[-2] += value
+                series[-1] += 1
+            for name, value in counters.items():
+                if value:
+                    self.values[name][view] = (
+                        self.values[name].get(view, 0) + value)
+
+    def snapshot(self):
+        with self.lock:
+            return {name: {view: (list(value) if isinstance(value, list)
+                                  else value)
+                           for view, value in series.items()}
+                    for name, series in self.values.items()}
+
+    def flush_due(self):
+        return time.monotonic() - self.flushed >= METRICS_FLUSH_INTERVAL
+
+    def claim_slot(self, entry):
+        """
+        Занимает свободный слот атомарным cache.add. Слот процесса, который
+        перестал сохранять снимки, освобождается по истечении срока.
+        """
+        for slot in range(METRICS_MAX_PROCESSES):
+            if cache.add(slot_key(slot), entry, METRICS_SNAPSHOT_TIMEOUT):
+                return slot
+        logger.warning('Нет свободного слота метрик для процесса %s',
+                       entry[0])
+        return None
+
+    def flush(self, force=False):
+        """Сохраняет снимок процесса в общий кэш не чаще раза в интервал."""
+        if not force and not self.flush_due():
+            return
+        self.flushed = time.monotonic()
+        entry = (process_name(), self.snapshot())
+        if self.slot is not None:
+            owner = cache.get(slot_key(self.slot))
+            # После fork слот родителя остаётся за родителем.
+            if owner is not None and owner[0] == entry[0]:
+                cache.set(slot_key(self.slot), entry,
+                          METRICS_SNAPSHOT_TIMEOUT)
+                return
+        self.slot = self.claim_slot(entry)
+
+    def collect(self):
+        """Сумма снимков живых процессов, свой снимок берётся свежим."""
+        self.flush(force=True)
+        slots = cache.get_many([slot_key(slot)
+                                for slot in range(METRICS_MAX_PROCESSES)])
+        total = {name: {} for name in self.values}
+        for _, snapshot in slots.values():
+            for name, series in snapshot.items():
+                for view, value in series.items():
+                    if name in COUNTERS:
+                        total[name][view] = total[name].get(view, 0) + value
+                        continue
+                    current = total[name].setdefault(view, [0] * len(value))
+                    total[name][view] = [a + b
+                                         for a, b in zip(current, value)]
+        return total
+
+
+registry = Registry()
+
+
+def escape_label(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def render_prometheus(values):
+    """Текстовый формат экспозиции Prometheus."""
+    lines = []
+    for name, (description, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+        for view, series in sorted(values[name].items()):
+            label = f'view="{escape_label(view)}"'
+            cumulative = 0
+            for bound, count in zip(buckets, series):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} '
+                             f'{cumulative}')
+            lines += [f'{name}_bucket{{{label},le="+Inf"}} {series[-1]}',
+                      f'{name}_sum{{{label}}} {series[-2]}',
+                      f'{name}_count{{{label}}} {series[-1]}']
+    for name, description in COUNTERS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} counter']
+        for view, value in sorted(values[name].items()):
+            lines.append(f'{name}{{view="{escape_label(view)}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def view_name(view_func, request):
+    """Имя представления: вьюсет и действие, например RecipesViewSet.list."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__qualname__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class QueryRecorder:
+    """Обёртка execute_wrapper: время и тексты SQL-запросов."""
+
+    def __init__(self):
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.statements[sql] += 1
+
+    @property
+    def count(self):
+        return sum(self.statements.values())
+
+    def n_plus_one_suspects(self):
+        """Одинаковые SELECT, повторённые в запросе слишком много раз."""
+        return [(sql, count) for sql, count in self.statements.items()
+                if count >= METRICS_N_PLUS_ONE_REPEATS
+                and sql.lstrip()[:6].upper() == 'SELECT']
+
+
+current_recorder = ContextVar('current_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection, **kwargs):
+    # В начало списка: execute_wrapper() снимает с конца свою обёртку,
+    # даже если соединение открылось внутри его блока.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+class MetricsMiddleware:
+    """
+    Измеряет запрос и добавляет к ответу заголовок Server-Timing.
+    Работает и под WSGI, и под ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Соединения, открытые до загрузки middleware.
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.measure(request, response, recorder, start)
+        registry.flush()
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.measure(request, response, recorder, start)
+        if registry.flush_due():
+            await sync_to_async(registry.flush)()
+        return response
+
+    def measure(self, request, response, recorder, start):
+        finished = time.perf_counter()
+        view_finished = getattr(request, 'metrics_view_finished', finished)
+        view_started = getattr(request, 'metrics_view_started', start)
+        render = finished - view_finished
+        app = max(view_finished - view_started - recorder.duration, 0.0)
+        suspects = recorder.n_plus_one_suspects()
+        view = getattr(request, 'metrics_view', 'unresolved')
+        for sql, count in suspects:
+            logger.warning('Возможный N+1 в %s: %d одинаковых запросов %s',
+                           view, count, sql)
+        total = finished - start
+        response['Server-Timing'] = ', '.join((
+            f'sql;dur={recorder.duration * 1000:.1f};'
+            f'desc="{recorder.count} queries"',
+            f'app;dur={app * 1000:.1f};desc="view minus sql"',
+            f'render;dur={render * 1000:.1f}',
+            *([f'n-plus-one;desc="{len(suspects)} suspects"']
+              if suspects else ()),
+            f'total;dur={total * 1000:.1f}',
+        ))
+        registry.observe(view, {
+            'foodgram_request_duration_seconds': total,
+            'foodgram_sql_duration_seconds': recorder.duration,
+            'foodgram_view_minus_sql_duration_seconds': app,
+            'foodgram_render_duration_seconds': render,
+            'foodgram_sql_queries': recorder.count,
+        }, {'foodgram_n_plus_one_suspects_total': int(bool(suspects))})
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_name(view_func, request)
+        request.metrics_view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Вызывается после представления, но до рендеринга ответа.
+        request.metrics_view_finished = time.perf_counter()
+        return response
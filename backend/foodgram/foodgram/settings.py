@@ -30,16 +30,19 @@ INSTALLED_APPS = [
     'djoser',
     'rest_framework.authtoken',
     'recipes',
+    'jobs',
     'django_filters',
     'colorfield',
 ]
 
 MIDDLEWARE = [
+    'foodgram.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'foodgram.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -85,6 +88,74 @@ else:
         }
     }
 
+# Реплики для чтения: в PostgreSQL список хостов host[:port] с теми же
+# учётными данными, в SQLite для локальной проверки список файлов.
+DB_REPLICAS = [replica.strip()
+               for replica in os.getenv('DB_REPLICAS', '').split(',')
+               if replica.strip()]
+for number, replica in enumerate(DB_REPLICAS, start=1):
+    if TESTING:
+        replica_settings = {**DATABASES['default'],
+                            'NAME': BASE_DIR / replica}
+    else:
+        host, _, port = replica.partition(':')
+        replica_settings = {**DATABASES['default'], 'HOST': host,
+                            'PORT': port or DATABASES['default']['PORT']}
+    DATABASES[f'replica_{number}'] = {**replica_settings,
+                                      'TEST': {'MIRROR': 'default'}}
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+
+# Server-Timing и гистограммы для /api/_metrics.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+
+# Без отдельного воркера фоновые задачи выполняются в процессе запроса.
+JOBS_EAGER = os.getenv('JOBS_EAGER', str(TESTING)) == 'True'
+
+# Версии данных в кэше меняют все процессы: gunicorn, uvicorn, воркер и
+# команды, поэтому в работе кэш общий — Redis по REDIS_URL. Без него кэш
+# в памяти процесса: годится для тестов и одного процесса разработки.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL and not TESTING:
+    CACHE_BACKEND = 'django.core.cache.backends.redis.RedisCache'
+    CACHE_LOCATION = REDIS_URL
+else:
+    CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+    CACHE_LOCATION = 'foodgram'
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', CACHE_BACKEND)
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', CACHE_LOCATION)
+# Версии данных хранятся отдельно от ответов: вытеснение ответов не должно
+# сбрасывать версии. В Redis их делит префикс ключей, а ключи без срока
+# (версии) не вытесняет политика volatile-lru, см. infra/docker-compose.yml.
+# Остальные бэкенды хранят версии отдельно и ограничивают число записей.
+if CACHE_BACKEND.endswith('RedisCache'):
+    CACHE_VERSIONS_LOCATION = CACHE_LOCATION
+    CACHE_OPTIONS = CACHE_VERSIONS_OPTIONS = {}
+else:
+    CACHE_VERSIONS_LOCATION = f'{CACHE_LOCATION}_versions'
+    CACHE_OPTIONS = {'MAX_ENTRIES': 10000}
+    # Ключ версии — на каталог, списки и каждый рецепт.
+    CACHE_VERSIONS_OPTIONS = {'MAX_ENTRIES': 10_000_000}
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+        # Все записи в кэш задают срок явно. Без срока по умолчанию incr
+        # в базе и в файлах (get + set) не делает версии временными.
+        'TIMEOUT': None,
+        'OPTIONS': CACHE_OPTIONS,
+    },
+    'versions': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_VERSIONS_LOCATION',
+                              CACHE_VERSIONS_LOCATION),
+        'KEY_PREFIX': 'versions',
+        'TIMEOUT': None,
+        'OPTIONS': CACHE_VERSIONS_OPTIONS,
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -116,6 +187,9 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'PDF_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
 
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from foodgram.metrics import Registry, slot_key
+
+REQUESTS = 'foodgram_request_duration_seconds'
+
+
+def observe(registry, duration):
+    registry.observe('RecipesViewSet.list', {REQUESTS: duration}, {})
+
+
+class RegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def flush(self, registry, process):
+        with mock.patch('foodgram.metrics.process_name',
+                        return_value=process):
+            registry.flush(force=True)
+
+    def test_processes_keep_separate_slots(self):
+        first, second = Registry(), Registry()
+        observe(first, 0.01)
+        observe(second, 0.02)
+        observe(second, 0.03)
+        self.flush(first, 'web:1')
+        self.flush(second, 'web:2')
+        self.flush(first, 'web:1')
+        self.assertEqual((first.slot, second.slot), (0, 1))
+        with mock.patch('foodgram.metrics.process_name',
+                        return_value='web:1'):
+            total = first.collect()
+        self.assertEqual(total[REQUESTS]['RecipesViewSet.list'][-1], 3)
+
+    def test_expired_slot_is_reused_and_foreign_slot_kept(self):
+        dead, forked = Registry(), Registry()
+        self.flush(dead, 'web:1')
+        cache.delete(slot_key(dead.slot))
+        self.flush(forked, 'web:2')
+        self.assertEqual(forked.slot, 0)
+        # Процесс с тем же слотом, но другим именем (после fork) не
+        # перезаписывает чужой снимок, а занимает новый слот.
+        self.flush(dead, 'web:3')
+        self.assertEqual(dead.slot, 1)
+        self.assertEqual(cache.get(slot_key(0))[0], 'web:2')
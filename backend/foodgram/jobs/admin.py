@@ -0,0 +1,14 @@
+from django.contrib.admin import ModelAdmin, register
+
+from .models import Job
+
+
+@register(Job)
+class JobAdmin(ModelAdmin):
+    """Администрирование фоновых задач."""
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at',
+                    'locked_by', 'updated')
+    list_filter = ('status', 'name')
+    search_fields = ('name',)
+    readonly_fields = ('created', 'updated', 'locked_at', 'locked_by',
+                       'last_error')
@@ -0,0 +1,54 @@
+import os
+import signal
+import socket
+import threading
+
+from django.db import connection
+from django.core.management.base import BaseCommand
+
+from core.constants import JOBS_POLL_INTERVAL
+from jobs.queue import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает воркер фоновых задач. С --once выполняет накопившиеся '
+        'задачи и завершается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Число потоков, выполняющих задачи.')
+        parser.add_argument('--poll-interval', type=float,
+                            default=JOBS_POLL_INTERVAL,
+                            help='Пауза в секундах при пустой очереди.')
+        parser.add_argument('--once', action='store_true',
+                            help='Завершиться, когда очередь опустеет.')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        threads = [
+            threading.Thread(
+                target=self.work,
+                args=(Worker(f'{prefix}:{number}',
+                             options['poll_interval']),
+                      stop, options['once']),
+                name=f'worker-{number}')
+            for number in range(max(options['concurrency'], 1))
+        ]
+        self.stdout.write(f'Воркер {prefix} запущен, потоков: '
+                          f'{len(threads)}.')
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.stdout.write('Воркер остановлен.')
+
+    def work(self, worker, stop, once):
+        try:
+            worker.run(stop, once)
+        finally:
+            connection.close()
@@ -0,0 +1,44 @@
+from django.db import models
+from django.utils import timezone
+
+from core.constants import JOBS_MAX_ATTEMPTS
+
+
+class Job(models.Model):
+    """Фоновая задача, которую выполняет воркер run_worker."""
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Ожидает'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Выполнена'
+        FAILED = 'failed', 'Ошибка'
+
+    name = models.CharField(verbose_name='Задача', max_length=255)
+    payload = models.JSONField(verbose_name='Параметры', default=dict)
+    status = models.CharField(verbose_name='Статус', max_length=16,
+                              choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(verbose_name='Попыток',
+                                                default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Максимум попыток', default=JOBS_MAX_ATTEMPTS)
+    run_at = models.DateTimeField(verbose_name='Запустить после',
+                                  default=timezone.now)
+    locked_at = models.DateTimeField(verbose_name='Взята в работу',
+                                     null=True, blank=True)
+    locked_by = models.CharField(verbose_name='Воркер', max_length=255,
+                                 blank=True)
+    last_error = models.TextField(verbose_name='Последняя ошибка',
+                                  blank=True)
+    created = models.DateTimeField(verbose_name='Создана', auto_now_add=True)
+    updated = models.DateTimeField(verbose_name='Обновлена', auto_now=True)
+
+    class Meta:
+        ordering = ('run_at', 'id')
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(fields=('status', 'run_at'),
+                         name='jobs_status_run_at_idx')]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.get_status_display()})'
@@ -0,0 +1,196 @@
+import logging
+import threading
+import traceback
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (DatabaseError, close_old_connections, connection,
+                       transaction)
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.constants import (JOBS_HEARTBEAT_INTERVAL, JOBS_LOCK_TIMEOUT,
+                            JOBS_MAX_ATTEMPTS, JOBS_POLL_INTERVAL,
+                            JOBS_PURGE_BATCH_SIZE, JOBS_PURGE_INTERVAL,
+                            JOBS_RETENTION, JOBS_RETRY_DELAY)
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def task(func):
+    """
+    Регистрирует функцию как фоновую задачу. Параметры задачи передаются
+    именованными аргументами и должны сериализоваться в JSON.
+    """
+    func.job_name = f'{func.__module__}.{func.__name__}'
+    registry[func.job_name] = func
+    return func
+
+
+def enqueue(func, *, run_at=None, max_attempts=JOBS_MAX_ATTEMPTS,
+            **payload):
+    """
+    Ставит задачу в очередь. Задача становится видна воркеру только после
+    фиксации текущей транзакции. При JOBS_EAGER задача выполняется сразу
+    после фиксации в текущем процессе, без записи в таблицу.
+    """
+    name = getattr(func, 'job_name', func)
+    if name not in registry:
+        raise LookupError(f'Неизвестная задача: {name}')
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: registry[name](**payload))
+        return None
+    return Job.objects.create(name=name, payload=payload,
+                              run_at=run_at or timezone.now(),
+                              max_attempts=max_attempts)
+
+
+class Worker:
+    """
+    Берёт задачи из таблицы по одной и выполняет их. Задачу захватывает
+    условный UPDATE по прежнему статусу, поэтому два воркера не возьмут
+    одну задачу; в PostgreSQL кандидаты выбираются через
+    SELECT ... FOR UPDATE SKIP LOCKED, в SQLite блокировка строк не нужна.
+    Пока задача выполняется, воркер раз в JOBS_HEARTBEAT_INTERVAL
+    обновляет locked_at; задача без отметки дольше JOBS_LOCK_TIMEOUT
+    считается брошенной упавшим воркером и возвращается в очередь.
+    Выполненные и упавшие задачи старше JOBS_RETENTION удаляются.
+    SQLite допускает только одного пишущего, поэтому в нём потоки одного
+    процесса захватывают и закрывают задачи по очереди.
+    """
+    sqlite_lock = threading.Lock()
+
+    def __init__(self, name, poll_interval=JOBS_POLL_INTERVAL,
+                 heartbeat_interval=JOBS_HEARTBEAT_INTERVAL):
+        self.name = name
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.purged = None
+
+    def write_lock(self):
+        if connection.vendor == 'sqlite':
+            return self.sqlite_lock
+        return nullcontext()
+
+    def candidates(self, now):
+        stale = now - timedelta(seconds=JOBS_LOCK_TIMEOUT)
+        return Job.objects.select_for_update(skip_locked=True).filter(
+            Q(status=Job.Status.PENDING, run_at__lte=now)
+            | Q(status=Job.Status.RUNNING, locked_at__lt=stale)
+        ).order_by('run_at', 'id')
+
+    def claim(self):
+        while True:
+            now = timezone.now()
+            with self.write_lock(), transaction.atomic():
+                job = self.candidates(now).first()
+                if job is None:
+                    return None
+                claimed = Job.objects.filter(
+                    pk=job.pk, status=job.status, attempts=job.attempts
+                ).update(status=Job.Status.RUNNING, locked_at=now,
+                         locked_by=self.name, attempts=F('attempts') + 1,
+                         updated=now)
+            if claimed:
+                job.status = Job.Status.RUNNING
+                job.attempts += 1
+                return job
+
+    def finish(self, job, **fields):
+        with self.write_lock():
+            Job.objects.filter(pk=job.pk, locked_by=self.name).update(
+                locked_at=None, updated=timezone.now(), **fields)
+
+    def touch(self, job):
+        """Отмечает, что задача ещё выполняется этим воркером."""
+        with self.write_lock():
+            return Job.objects.filter(
+                pk=job.pk, status=Job.Status.RUNNING, locked_by=self.name
+            ).update(locked_at=timezone.now())
+
+    def heartbeat(self, job, done):
+        try:
+            while not done.wait(self.heartbeat_interval):
+                self.touch(job)
+        except DatabaseError:
+            logger.exception('Воркер %s: не удалось продлить задачу #%s',
+                             self.name, job.pk)
+        finally:
+            connection.close()
+
+    def purge(self, now):
+        """Удаляет пачками завершённые задачи старше JOBS_RETENTION."""
+        expired = Job.objects.filter(
+            status__in=(Job.Status.DONE, Job.Status.FAILED),
+            updated__lt=now - timedelta(seconds=JOBS_RETENTION))
+        deleted = 0
+        while True:
+            with self.write_lock():
+                batch = list(expired.values_list('pk', flat=True)[
+                    :JOBS_PURGE_BATCH_SIZE])
+                if not batch:
+                    return deleted
+                deleted += Job.objects.filter(pk__in=batch).delete()[0]
+
+    def execute(self, job):
+        done = threading.Event()
+        threading.Thread(target=self.heartbeat, args=(job, done),
+                         name=f'{self.name}:heartbeat', daemon=True).start()
+        try:
+            return self.perform(job)
+        finally:
+            done.set()
+
+    def perform(self, job):
+        now = timezone.now()
+        try:
+            func = registry.get(job.name)
+            if func is None:
+                raise LookupError(f'Неизвестная задача: {job.name}')
+            func(**job.payload)
+        except Exception:
+            logger.exception('Задача %s #%s завершилась ошибкой',
+                             job.name, job.pk)
+            if job.attempts >= job.max_attempts:
+                status, run_at = Job.Status.FAILED, job.run_at
+            else:
+                status = Job.Status.PENDING
+                run_at = now + timedelta(
+                    seconds=JOBS_RETRY_DELAY * 2 ** (job.attempts - 1))
+            self.finish(job, status=status, run_at=run_at,
+                        last_error=traceback.format_exc())
+            return False
+        self.finish(job, status=Job.Status.DONE, last_error='')
+        return True
+
+    def purge_expired(self):
+        now = timezone.now()
+        if self.purged and (now - self.purged).total_seconds() < (
+                JOBS_PURGE_INTERVAL):
+            return
+        self.purged = now
+        deleted = self.purge(now)
+        if deleted:
+            logger.info('Воркер %s: удалено старых задач: %s',
+                        self.name, deleted)
+
+    def run(self, stop, once=False):
+        """Выполняет задачи до сигнала stop, а с once - пока они есть."""
+        while not stop.is_set():
+            close_old_connections()
+            try:
+                job = self.claim()
+                if job is not None:
+                    self.execute(job)
+                    continue
+                self.purge_expired()
+            except DatabaseError:
+                # Незакрытая задача вернётся в очередь по JOBS_LOCK_TIMEOUT.
+                logger.exception('Воркер %s: ошибка базы данных', self.name)
+            if once:
+                break
+            stop.wait(self.poll_interval)
@@ -0,0 +1,115 @@
+import threading
+from datetime import timedelta
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core.constants import JOBS_LOCK_TIMEOUT, JOBS_RETENTION
+from jobs.models import Job
+from jobs.queue import Worker, enqueue, task
+
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task
+def fail():
+    raise ValueError('сбой')
+
+
+@override_settings(JOBS_EAGER=False)
+class WorkerTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+        self.worker = Worker('test:1')
+
+    def test_claim_runs_due_jobs_in_order(self):
+        later = enqueue(record, value='later',
+                        run_at=timezone.now() + timedelta(hours=1))
+        first, second = enqueue(record, value=1), enqueue(record, value=2)
+        self.worker.run(threading.Event(), once=True)
+        self.assertEqual(calls, [1, 2])
+        for job in (first, second):
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.locked_at),
+                             (Job.Status.DONE, 1, None))
+        later.refresh_from_db()
+        self.assertEqual(later.status, Job.Status.PENDING)
+
+    def test_claimed_job_is_not_claimed_twice(self):
+        job = enqueue(record, value=1)
+        self.assertEqual(self.worker.claim().pk, job.pk)
+        self.assertIsNone(Worker('test:2').claim())
+
+    def test_failure_is_retried_with_backoff_then_failed(self):
+        job = enqueue(fail, max_attempts=2)
+        before = timezone.now()
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertFalse(self.worker.execute(self.worker.claim()))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts),
+                         (Job.Status.PENDING, 1))
+        self.assertIn('ValueError', job.last_error)
+        self.assertGreater(job.run_at, before)
+        self.assertIsNone(self.worker.claim())
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertFalse(self.worker.execute(self.worker.claim()))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 2))
+
+    def test_only_stale_running_jobs_are_reclaimed(self):
+        job = enqueue(record, value=1)
+        self.worker.claim()
+        other = Worker('test:2')
+        self.assertEqual(self.worker.touch(job), 1)
+        self.assertIsNone(other.claim())
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now()
+            - timedelta(seconds=JOBS_LOCK_TIMEOUT + 1))
+        reclaimed = other.claim()
+        self.assertEqual((reclaimed.pk, reclaimed.attempts), (job.pk, 2))
+        # Прежний воркер больше не может ни продлить, ни закрыть задачу.
+        self.assertEqual(self.worker.touch(job), 0)
+        self.worker.finish(job, status=Job.Status.DONE)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by),
+                         (Job.Status.RUNNING, 'test:2'))
+
+    def test_purge_removes_only_old_finished_jobs(self):
+        now = timezone.now()
+        old = now - timedelta(seconds=JOBS_RETENTION + 1)
+        jobs = {status: enqueue(record, value=status) for status in (
+            Job.Status.DONE, Job.Status.FAILED, Job.Status.PENDING)}
+        for status, job in jobs.items():
+            Job.objects.filter(pk=job.pk).update(status=status, updated=old)
+        fresh = enqueue(record, value='fresh')
+        Job.objects.filter(pk=fresh.pk).update(status=Job.Status.DONE)
+        self.assertEqual(self.worker.purge(now), 2)
+        self.assertQuerysetEqual(
+            Job.objects.order_by('pk').values_list('pk', flat=True),
+            [jobs[Job.Status.PENDING].pk, fresh.pk])
+
+
+@task
+def wait_for_heartbeat(job_id):
+    started = timezone.now()
+    while not Job.objects.filter(pk=job_id, locked_at__gt=started).exists():
+        if (timezone.now() - started).total_seconds() > 5:
+            raise TimeoutError('Нет отметки heartbeat')
+        threading.Event().wait(0.01)
+
+
+@override_settings(JOBS_EAGER=False)
+class HeartbeatTests(TransactionTestCase):
+
+    def test_running_job_is_kept_locked(self):
+        job = enqueue(wait_for_heartbeat, job_id=0)
+        Job.objects.filter(pk=job.pk).update(payload={'job_id': job.pk})
+        worker = Worker('test:1', heartbeat_interval=0.05)
+        self.assertTrue(worker.execute(worker.claim()))
@@ -1,62 +1,138 @@
-from django.contrib.admin import ModelAdmin, register, display
+from contextlib import contextmanager
+from functools import partial
+
+from django.contrib.admin import TabularInline, register, display
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.html import format_html
 
+from api.caching import recipe_composition_changed
+from api.services import tracking_shopping_lists
+
+from .admin_tools import ScalableModelAdmin, input_filter
 from .models import (IngredientsForRecipes, Recipes, Ingredients, Favorites,
                      ShoppingCart, Tags)
 
 
 @register(Favorites)
-class FavoriteAdmin(ModelAdmin):
+class FavoriteAdmin(ScalableModelAdmin):
     """Адмминистрирование избранных рецептов."""
     list_display = ('author', 'recipe')
-    list_filter = ('author',)
-    search_fields = ('author',)
+    list_filter = (input_filter('author__username', 'автору'),)
+    list_select_related = ('author', 'recipe')
+    search_fields = ('^recipe__name',)
+    autocomplete_fields = ('author', 'recipe')
 
 
 @register(ShoppingCart)
-class ShoppingCartAdmin(ModelAdmin):
+class ShoppingCartAdmin(ScalableModelAdmin):
     """Администрирование покупок."""
     list_display = ('author', 'recipe')
-    list_filter = ('author',)
-    search_fields = ('author',)
+    list_filter = (input_filter('author__username', 'автору'),)
+    list_select_related = ('author', 'recipe')
+    search_fields = ('^recipe__name',)
+    autocomplete_fields = ('author', 'recipe')
+
+
+@contextmanager
+def changing_composition(recipes):
+    """
+    Правка строк состава без сохранения рецепта: переносит её в списки
+    покупок, сбрасывает кэш рецептов и обновляет индекс подбора.
+    """
+    with tracking_shopping_lists(recipes):
+        yield
+        for pk in recipes:
+            transaction.on_commit(partial(recipe_composition_changed, pk))
 
 
 @register(IngredientsForRecipes)
-class IngredientRecipeAdmin(ModelAdmin):
+class IngredientRecipeAdmin(ScalableModelAdmin):
     """Администрирование ингридентов для рецептов."""
     list_display = ('id', 'recipe', 'ingredient', 'amount',)
-    list_filter = ('recipe', 'ingredient')
-    search_fields = ('name',)
+    list_filter = (input_filter('recipe__name__istartswith', 'рецепту'),
+                   input_filter('ingredient__name__istartswith',
+                                'ингредиенту'))
+    list_select_related = ('recipe', 'ingredient')
+    search_fields = ('^recipe__name', '^ingredient__name')
+    autocomplete_fields = ('recipe', 'ingredient')
+
+    def save_model(self, request, obj, form, change):
+        # Строку могли перенести в другой рецепт: меняются оба.
+        recipes = {obj.recipe_id, *IngredientsForRecipes.objects.filter(
+            pk=obj.pk).values_list('recipe', flat=True)}
+        with changing_composition(recipes):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with changing_composition([obj.recipe_id]):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with changing_composition(set(queryset.values_list(
+                'recipe', flat=True))):
+            super().delete_queryset(request, queryset)
+
+
+class IngredientsForRecipesInline(TabularInline):
+    model = IngredientsForRecipes
+    autocomplete_fields = ('ingredient',)
+    min_num = 1
+    extra = 0
 
 
 @register(Recipes)
-class RecipeAdmin(ModelAdmin):
+class RecipeAdmin(ScalableModelAdmin):
     """Администрирование рецептов."""
-    list_display = ('id', 'author', 'name', 'pub_date', 'in_favorite', )
-    search_fields = ('name',)
-    list_filter = ('pub_date', 'author', 'name', 'tags')
-    filter_horizontal = ('ingredients',)
+    list_display = ('id', 'author', 'name', 'pub_date', 'in_favorite',
+                    'in_carts_count')
+    search_fields = ('^name',)
+    list_filter = ('pub_date', input_filter('author__username', 'автору'),
+                   'tags')
+    list_select_related = ('author',)
+    autocomplete_fields = ('author',)
+    filter_horizontal = ('tags',)
+    inlines = (IngredientsForRecipesInline,)
     empty_value_display = '-пусто-'
 
-    @display()
+    def save_related(self, request, form, formsets, change):
+        # Ингредиенты из инлайна меняют списки покупок, в которых рецепт.
+        recipes = [form.instance.pk] if change else []
+        with tracking_shopping_lists(recipes):
+            super().save_related(request, form, formsets, change)
+
+    @display(ordering='favorites_count')
     def in_favorite(self, obj):
-        return obj.favorite.all().count()
+        return obj.favorites_count
 
     in_favorite.short_description = 'Добавленные рецепты в избранное'
 
 
 @register(Ingredients)
-class IngredientAdmin(ModelAdmin):
+class IngredientAdmin(ScalableModelAdmin):
     """
     Администрирвоание ингридиентов.
     """
-    list_display = ('name', 'measurement_unit')
-    list_filter = ('name',)
-    search_fields = ('name',)
+    list_display = ('name', 'measurement_unit', 'recipes_count')
+    list_filter = (input_filter('measurement_unit', 'единице измерения'),)
+    search_fields = ('^name',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_count=Coalesce(Subquery(
+                IngredientsForRecipes.objects.filter(
+                    ingredient=OuterRef('pk')
+                ).order_by().values('ingredient').annotate(
+                    total=Count('pk')).values('total')), 0))
+
+    @display(description='Рецептов', ordering='recipes_count')
+    def recipes_count(self, obj):
+        return obj.recipes_count
 
 
 @register(Tags)
-class TagAdmin(ModelAdmin):
+class TagAdmin(ScalableModelAdmin):
     '''Администрирование тэгов'''
     list_display = ("name", "slug", "color_code")
     search_fields = ("name", "color")
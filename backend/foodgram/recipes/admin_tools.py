@@ -0,0 +1,75 @@
+from django.contrib.admin import ModelAdmin, SimpleListFilter
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from core.constants import ADMIN_ESTIMATE_THRESHOLD, ADMIN_LIST_PER_PAGE
+
+
+class InputFilter(SimpleListFilter):
+    """
+    Фильтр с полем ввода вместо списка всех значений: боковая панель
+    не перебирает таблицу, как это делает фильтр по внешнему ключу.
+    """
+    template = 'admin/input_filter.html'
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        # Непустой список нужен, чтобы фильтр отображался.
+        return ((),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice['query_parts'] = (
+            (name, value)
+            for name, value in changelist.get_filters_params().items()
+            if name != self.parameter_name)
+        yield all_choice
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if value:
+            return queryset.filter(**{self.lookup: value})
+        return queryset
+
+
+def input_filter(lookup, title, parameter_name=None):
+    """Создаёт InputFilter по полю lookup, например author__username."""
+    return type('InputFilter', (InputFilter,), {
+        'lookup': lookup,
+        'title': title,
+        'parameter_name': parameter_name or lookup.split('__')[0],
+    })
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Для таблицы без фильтров в PostgreSQL берёт число строк из статистики
+    планировщика (pg_class.reltuples) вместо COUNT(*) по всей таблице.
+    Небольшие таблицы и отфильтрованные списки считаются точно.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None or query.where:
+            return super().count
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'postgresql':
+            return super().count
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                (self.object_list.model._meta.db_table,))
+            row = cursor.fetchone()
+        estimate = int(row[0]) if row else -1
+        if estimate < ADMIN_ESTIMATE_THRESHOLD:
+            return super().count
+        return estimate
+
+
+class ScalableModelAdmin(ModelAdmin):
+    """Базовая админка для больших таблиц."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = ADMIN_LIST_PER_PAGE
@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+from recipes.search import install_sqlite_search
+
+
+def restore_sqlite_search(using, **kwargs):
+    """Восстанавливает FTS-индекс SQLite после каждой миграции."""
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        install_sqlite_search(connection)
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        post_migrate.connect(restore_sqlite_search, sender=self)
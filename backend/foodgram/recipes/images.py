@@ -0,0 +1,72 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from core.constants import (IMAGE_JPEG_QUALITY, IMAGE_VARIANTS,
+                            IMAGE_VARIANTS_DIR, IMAGE_WEBP_QUALITY)
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': IMAGE_WEBP_QUALITY, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': IMAGE_JPEG_QUALITY, 'optimize': True,
+                      'progressive': True}),
+}
+
+
+def flatten(image):
+    """Приводит изображение к RGB, прозрачный фон заменяется белым."""
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def encode(image, image_format):
+    pil_format, options = FORMATS[image_format]
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def build_image_variants(recipe):
+    """
+    Сохраняет уменьшенные копии изображения рецепта в WebP и JPEG и
+    возвращает их описание: размеры и пути в хранилище по каждому размеру.
+    Поворот применяется по EXIF, сами метаданные в копии не попадают.
+    """
+    with recipe.image.open('rb') as file:
+        with Image.open(file) as original:
+            image = flatten(ImageOps.exif_transpose(original))
+    stem = os.path.splitext(os.path.basename(recipe.image.name))[0]
+    variants = {}
+    for name, width in IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+        variant = {'width': resized.width, 'height': resized.height}
+        for image_format in FORMATS:
+            path = default_storage.save(
+                f'{IMAGE_VARIANTS_DIR}/{recipe.pk}/{stem}-{name}.'
+                f'{image_format}',
+                ContentFile(encode(resized, image_format)))
+            variant[image_format] = path
+        variants[name] = variant
+    return variants
+
+
+def delete_image_variants(variants):
+    for variant in variants.values():
+        for image_format in FORMATS:
+            if variant.get(image_format):
+                default_storage.delete(variant[image_format])
+
+
+def update_image_variants(recipe):
+    """Пересоздаёт копии изображения рецепта и удаляет прежние."""
+    old_variants = recipe.image_variants
+    recipe.image_variants = build_image_variants(recipe)
+    recipe.save(update_fields=('image_variants',))
+    delete_image_variants(old_variants)
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.5 on 2024-01-15 12:00
+
+import colorfield.fields
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_shopping_lists(apps, schema_editor):
+    IngredientsForRecipes = apps.get_model('recipes', 'IngredientsForRecipes')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    totals = IngredientsForRecipes.objects.filter(
+        recipe__shopping_cart__isnull=False
+    ).values(
+        'recipe__shopping_cart__author', 'ingredient'
+    ).annotate(total=Sum('amount')).order_by()
+    ShoppingListItem.objects.bulk_create(
+        (ShoppingListItem(author_id=item['recipe__shopping_cart__author'],
+                          ingredient_id=item['ingredient'],
+                          amount=item['total']) for item in totals.iterator()),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0003_alter_tags_color'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipes',
+            options={'default_related_name': 'recipes', 'ordering': ('-pub_date',)},
+        ),
+        migrations.AlterField(
+            model_name='ingredientsforrecipes',
+            name='amount',
+            field=models.PositiveSmallIntegerField(help_text='Укажите количество ингридиента', validators=[django.core.validators.MinValueValidator(0, 'Минимальное количество ингридиентов 0')], verbose_name='Количество ингридиента'),
+        ),
+        migrations.AlterField(
+            model_name='recipes',
+            name='cooking_time',
+            field=models.PositiveSmallIntegerField(help_text='Укажите время приготовления рецепта', verbose_name='Время приготовления'),
+        ),
+        migrations.AlterField(
+            model_name='tags',
+            name='color',
+            field=colorfield.fields.ColorField(default='#FF0000', help_text='Выберите цвета', image_field=None, max_length=30, samples=None, unique=True, verbose_name='HEX цвета'),
+        ),
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='Количество ингридиента')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_items', to='recipes.ingredients', verbose_name='Ингридиент')),
+            ],
+            options={
+                'verbose_name': 'Позиция списка покупок',
+                'verbose_name_plural': 'Позиции списка покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('author', 'ingredient'), name='unique_shopping_list_item'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.5 on 2024-01-22 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipes',
+            options={'default_related_name': 'recipes', 'ordering': ('-pub_date', '-id')},
+        ),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipes_pub_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.5 on 2024-01-29 12:00
+
+from django.db import migrations
+
+from recipes.search import install_search
+
+
+def install(apps, schema_editor):
+    install_search(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    install_search(schema_editor.connection, reverse=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipes_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2024-02-05 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipes_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Уменьшенные копии изображения в WebP и JPEG', verbose_name='Размеры изображения'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.5 on 2024-02-19 12:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipes = apps.get_model('recipes', 'Recipes')
+    Recipes.objects.update(
+        favorites_count=count_of(apps.get_model('recipes', 'Favorites'),
+                                 'recipe'),
+        in_carts_count=count_of(apps.get_model('recipes', 'ShoppingCart'),
+                                'recipe'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipes_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipes',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
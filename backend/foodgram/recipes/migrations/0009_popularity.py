@@ -0,0 +1,83 @@
+# Generated by Django 4.2.5 on 2024-02-26 12:00
+
+import math
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+from core.constants import (POPULARITY_EPOCH, POPULARITY_HALF_LIFE,
+                            POPULARITY_PUBLISH_WEIGHT,
+                            POPULARITY_REFRESH_CHUNK_SIZE)
+
+
+def backfill_created(apps, schema_editor):
+    """
+    Когда добавлены существующие записи избранного и корзин, неизвестно.
+    Им ставится дата публикации рецепта: текущее время подняло бы эти
+    рецепты в ленте популярных на целый период затухания.
+    """
+    Recipes = apps.get_model('recipes', 'Recipes')
+    for model_name in ('Favorites', 'ShoppingCart'):
+        apps.get_model('recipes', model_name).objects.update(
+            created=Subquery(Recipes.objects.filter(
+                pk=OuterRef('recipe')).values('pub_date')[:1]))
+
+
+def create_popularity(apps, schema_editor):
+    """
+    Строки популярности для существующих рецептов с оценкой только по
+    дате публикации. Первый запуск refresh_popularity пересчитает все
+    рецепты целиком.
+    """
+    Recipes = apps.get_model('recipes', 'Recipes')
+    RecipePopularity = apps.get_model('recipes', 'RecipePopularity')
+    RecipePopularity.objects.bulk_create(
+        (RecipePopularity(
+            recipe_id=pk,
+            score=math.log2(POPULARITY_PUBLISH_WEIGHT)
+            + (pub_date.timestamp() - POPULARITY_EPOCH)
+            / POPULARITY_HALF_LIFE)
+         for pk, pub_date in Recipes.objects.values_list(
+            'id', 'pub_date').iterator()),
+        batch_size=POPULARITY_REFRESH_CHUNK_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipes_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorites',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now, verbose_name='Добавлено'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now, verbose_name='Добавлено'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_created, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='RecipePopularity',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='recipes.recipes', verbose_name='Рецепт')),
+                ('score', models.FloatField(default=0, verbose_name='Популярность')),
+                ('favorites', models.PositiveIntegerField(default=0, verbose_name='В избранном')),
+                ('in_carts', models.PositiveIntegerField(default=0, verbose_name='В корзинах')),
+                ('refreshed', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Пересчитана')),
+            ],
+            options={
+                'verbose_name': 'Популярность рецепта',
+                'verbose_name_plural': 'Популярность рецептов',
+                'indexes': [models.Index(fields=['-score', '-recipe'], name='recipes_popularity_score_idx')],
+            },
+        ),
+        migrations.RunPython(create_popularity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.5 on 2024-03-04 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchIndex',
+            fields=[
+                ('recipe', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='recipes.recipes', verbose_name='Рецепт')),
+                ('query', models.TextField(db_column='recipes_recipes_fts', verbose_name='Поисковый запрос')),
+                ('rank', models.FloatField(db_column='rank', verbose_name='Ранг bm25')),
+            ],
+            options={
+                'verbose_name': 'Поисковый индекс рецепта',
+                'verbose_name_plural': 'Поисковый индекс рецептов',
+                'db_table': 'recipes_recipes_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -5,6 +5,7 @@ from django.core.validators import MinValueValidator
 from core.constants import (MIN_AMOUNT_INREDIENTS, NAME_MAX_LENGTH,
                             COLOR_MAX_LENGHT, SLUG_MAX_LENGHT,
                             CHAR_FIELD_MAX_LENGTH)
+from recipes.search import FTS_TABLE
 from users.models import User
 
 
@@ -25,7 +26,7 @@ class Tags(models.Model):
         verbose_name = 'Тег'
         verbose_name_plural = 'Теги'
 
-    def __srt__(self):
+    def __str__(self):
         return f'{self.name}'
 
 
@@ -77,10 +78,24 @@ class Recipes(models.Model):
                               upload_to='media/')
     pub_date = models.DateTimeField(verbose_name='Время публикации',
                                     auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном', default=0, editable=False)
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В корзинах', default=0, editable=False)
+    image_variants = models.JSONField(
+        verbose_name='Размеры изображения', default=dict, blank=True,
+        editable=False,
+        help_text='Уменьшенные копии изображения в WebP и JPEG')
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         default_related_name = 'recipes'
+        indexes = [
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipes_pub_date_id_idx')]
+
+    def __str__(self):
+        return f'{self.name}'
 
 
 class IngredientsForRecipes(models.Model):
@@ -108,11 +123,35 @@ class BaseModelForShoppingCartAndRecipes(models.Model):
                                verbose_name='Автор')
     recipe = models.ForeignKey(Recipes, on_delete=models.CASCADE,
                                verbose_name='Рецепт')
+    created = models.DateTimeField(verbose_name='Добавлено',
+                                   auto_now_add=True, db_index=True)
 
     class Meta:
         abstract = True
 
 
+class RecipeSearchIndex(models.Model):
+    """
+    Полнотекстовый индекс FTS5 рецептов в SQLite, см. recipes.search.
+    Таблицу создаёт и наполняет триггерами recipes.search, поэтому модель
+    неуправляемая: через неё ORM присоединяет индекс к рецептам.
+    """
+    recipe = models.OneToOneField(Recipes, on_delete=models.DO_NOTHING,
+                                  primary_key=True, db_column='rowid',
+                                  db_constraint=False,
+                                  related_name='search_index',
+                                  verbose_name='Рецепт')
+    query = models.TextField(db_column=FTS_TABLE,
+                             verbose_name='Поисковый запрос')
+    rank = models.FloatField(db_column='rank', verbose_name='Ранг bm25')
+
+    class Meta:
+        managed = False
+        db_table = FTS_TABLE
+        verbose_name = 'Поисковый индекс рецепта'
+        verbose_name_plural = 'Поисковый индекс рецептов'
+
+
 class Favorites(BaseModelForShoppingCartAndRecipes):
     """Модель для избранных рецептов."""
     class Meta:
@@ -133,3 +172,59 @@ class ShoppingCart(BaseModelForShoppingCartAndRecipes):
 
     def __str__(self):
         return f'{self.recipe} в корзине'
+
+
+class RecipePopularity(models.Model):
+    """
+    Популярность рецепта с затуханием во времени, см. recipes.popularity.
+    Пересчитывается командой refresh_popularity, favorites и in_carts —
+    число записей, по которым посчитана оценка. Пустой refreshed значит,
+    что рецепт ждёт пересчёта.
+    """
+    recipe = models.OneToOneField(Recipes, on_delete=models.CASCADE,
+                                  primary_key=True,
+                                  related_name='popularity',
+                                  verbose_name='Рецепт')
+    score = models.FloatField(verbose_name='Популярность', default=0)
+    favorites = models.PositiveIntegerField(verbose_name='В избранном',
+                                            default=0)
+    in_carts = models.PositiveIntegerField(verbose_name='В корзинах',
+                                           default=0)
+    refreshed = models.DateTimeField(verbose_name='Пересчитана', null=True,
+                                     blank=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        indexes = [
+            models.Index(fields=('-score', '-recipe'),
+                         name='recipes_popularity_score_idx')]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.score:.2f}'
+
+
+class ShoppingListItem(models.Model):
+    """
+    Суммарное количество ингредиента в списке покупок пользователя.
+    Обновляется при изменении корзины и рецептов в ней.
+    """
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='shopping_list',
+                               verbose_name='Автор')
+    ingredient = models.ForeignKey(Ingredients, on_delete=models.CASCADE,
+                                   related_name='shopping_list_items',
+                                   verbose_name='Ингридиент')
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество ингридиента')
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['author', 'ingredient'],
+                name='unique_shopping_list_item')]
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.amount}'
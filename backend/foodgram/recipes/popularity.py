@@ -0,0 +1,123 @@
+"""
+Популярность рецептов по избранному и спискам покупок с затуханием во
+времени. Публикация, добавление в избранное и в список покупок — события
+со своими весами, и каждое весит вдвое меньше за каждые
+POPULARITY_HALF_LIFE секунд возраста.
+
+Оценки не устаревают с течением времени: вместо веса события, делённого
+на 2 ** (возраст / полураспад), хранится log2 суммы весов, умноженных
+на 2 ** ((время события - эпоха) / полураспад). Сдвиг «сейчас» делит
+все суммы на одно и то же число и не меняет порядок рецептов, поэтому
+пересчитывать нужно только рецепты с новыми событиями.
+"""
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.constants import (POPULARITY_CART_WEIGHT, POPULARITY_EPOCH,
+                            POPULARITY_FAVORITE_WEIGHT, POPULARITY_HALF_LIFE,
+                            POPULARITY_PUBLISH_WEIGHT,
+                            POPULARITY_REFRESH_CHUNK_SIZE)
+from recipes.models import Favorites, RecipePopularity, Recipes, ShoppingCart
+
+
+def event_exponent(weight, moment):
+    return (math.log2(weight)
+            + (moment.timestamp() - POPULARITY_EPOCH) / POPULARITY_HALF_LIFE)
+
+
+def popularity_score(events):
+    """log2 суммы взвешенных событий (вес, время) без переполнения."""
+    exponents = [event_exponent(weight, moment) for weight, moment in events]
+    top = max(exponents)
+    return top + math.log2(sum(2 ** (value - top) for value in exponents))
+
+
+def initial_popularity(recipe):
+    """Оценка рецепта без избранного и покупок."""
+    return event_exponent(POPULARITY_PUBLISH_WEIGHT, recipe.pub_date)
+
+
+def changed_recipes(since):
+    """
+    Рецепты, которым нужен пересчёт: опубликованные или с новыми
+    записями в избранном и списках покупок после since, а также
+    помеченные при удалении записей (refreshed сброшен сигналом).
+    Все выборки идут по индексам, без просмотра всей таблицы рецептов.
+    """
+    changed = set(RecipePopularity.objects.filter(
+        refreshed__isnull=True).values_list('recipe', flat=True))
+    changed.update(Recipes.objects.filter(pub_date__gte=since).values_list(
+        'id', flat=True))
+    for model in (Favorites, ShoppingCart):
+        changed.update(model.objects.filter(created__gte=since).values_list(
+            'recipe', flat=True).distinct())
+    return changed
+
+
+def locked_recipes(ids):
+    """
+    Рецепты ids, чьи оценки сейчас меняет другая транзакция: удаление из
+    избранного или списка покупок держит строку до фиксации и затем
+    сбрасывает refreshed. Остальные строки блокируются до конца текущей
+    транзакции, поэтому сброс refreshed выполнится после записи оценки.
+    """
+    existing = RecipePopularity.objects.filter(recipe__in=ids)
+    free = set(existing.select_for_update(skip_locked=True).values_list(
+        'recipe', flat=True))
+    return set(existing.values_list('recipe', flat=True)) - free
+
+
+def score_recipes(ids, refreshed):
+    """
+    Пересчитывает оценки рецептов ids целиком по их событиям. Рецепты,
+    заблокированные удалением записей, пропускаются: они остаются
+    помеченными и пересчитываются при следующем запуске.
+    """
+    popularity = {}
+    events = defaultdict(list)
+    with transaction.atomic():
+        ids = sorted(set(ids) - locked_recipes(ids))
+        for pk, pub_date in Recipes.objects.filter(id__in=ids).values_list(
+                'id', 'pub_date'):
+            popularity[pk] = RecipePopularity(recipe_id=pk,
+                                              refreshed=refreshed)
+            events[pk].append((POPULARITY_PUBLISH_WEIGHT, pub_date))
+        for model, weight, counter in (
+                (Favorites, POPULARITY_FAVORITE_WEIGHT, 'favorites'),
+                (ShoppingCart, POPULARITY_CART_WEIGHT, 'in_carts')):
+            for pk, created in model.objects.filter(
+                    recipe__in=ids).values_list('recipe', 'created'):
+                events[pk].append((weight, created))
+                item = popularity[pk]
+                setattr(item, counter, getattr(item, counter) + 1)
+        for pk, item in popularity.items():
+            item.score = popularity_score(events[pk])
+        RecipePopularity.objects.bulk_create(
+            popularity.values(), update_conflicts=True,
+            unique_fields=('recipe',),
+            update_fields=('score', 'favorites', 'in_carts', 'refreshed'))
+    return len(popularity)
+
+
+def refresh_popularity(full=False):
+    """
+    Пересчитывает оценки рецептов с активностью после прошлого запуска,
+    а при full или первом запуске — всех рецептов. Возвращает число
+    пересчитанных рецептов.
+    """
+    started = timezone.now()
+    since = None if full else RecipePopularity.objects.aggregate(
+        Max('refreshed'))['refreshed__max']
+    if since is None:
+        ids = list(Recipes.objects.order_by('id').values_list(
+            'id', flat=True))
+    else:
+        ids = sorted(changed_recipes(since))
+    return sum(
+        score_recipes(ids[start:start + POPULARITY_REFRESH_CHUNK_SIZE],
+                      started)
+        for start in range(0, len(ids), POPULARITY_REFRESH_CHUNK_SIZE))
@@ -0,0 +1,123 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, F, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+SEARCH_VECTOR_INDEX = 'recipes_search_vector_idx'
+FTS_TABLE = 'recipes_recipes_fts'
+
+POSTGRES_INSTALL = (
+    f"""
+    ALTER TABLE recipes_recipes ADD COLUMN IF NOT EXISTS search_vector
+    tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(text, '')), 'B')
+    ) STORED
+    """,
+    f"""
+    CREATE INDEX IF NOT EXISTS {SEARCH_VECTOR_INDEX}
+    ON recipes_recipes USING GIN (search_vector)
+    """,
+)
+POSTGRES_UNINSTALL = (
+    f'DROP INDEX IF EXISTS {SEARCH_VECTOR_INDEX}',
+    'ALTER TABLE recipes_recipes DROP COLUMN IF EXISTS search_vector',
+)
+
+SQLITE_INSTALL = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, text, content='recipes_recipes', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai
+    AFTER INSERT ON recipes_recipes BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad
+    AFTER DELETE ON recipes_recipes BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF name, text ON recipes_recipes BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    # Колонка rank по умолчанию считает bm25 без весов: совпадение
+    # в названии весит в 10 раз больше, чем в описании.
+    f"""
+    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank)
+    VALUES ('rank', 'bm25(10.0, 1.0)')
+    """,
+)
+
+WORD = re.compile(r'\w+')
+
+
+def install_search(connection, reverse=False):
+    """
+    Создаёт в PostgreSQL вычисляемую колонку tsvector с GIN-индексом.
+    Вызывается миграцией; в SQLite индекс создаёт install_sqlite_search.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for statement in POSTGRES_UNINSTALL if reverse else POSTGRES_INSTALL:
+            cursor.execute(statement)
+
+
+def install_sqlite_search(connection):
+    """
+    Создаёт в SQLite таблицу FTS5 с триггерами и перестраивает её.
+    SQLite пересоздаёт таблицу при изменении её колонок и теряет триггеры,
+    поэтому индекс ставится не миграцией, а после каждого migrate.
+    """
+    with connection.cursor() as cursor:
+        for statement in SQLITE_INSTALL:
+            cursor.execute(statement)
+
+
+def sqlite_match(query):
+    """Запрос FTS5: каждое слово ищется по началу, все слова обязательны."""
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query))
+
+
+def search_recipes(queryset, query):
+    """
+    Оставляет рецепты, подходящие под поисковый запрос, и добавляет
+    аннотацию search_rank: чем больше, тем выше релевантность.
+    Совпадение в названии весит больше, чем в описании.
+    """
+    if connection.vendor == 'postgresql':
+        tsquery = 'websearch_to_tsquery(%s::regconfig, %s)'
+        params = (SEARCH_CONFIG, query)
+        return queryset.filter(RawSQL(
+            f'recipes_recipes.search_vector @@ {tsquery}', params,
+            output_field=BooleanField(),
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank(recipes_recipes.search_vector, {tsquery})', params,
+            output_field=FloatField(),
+        ))
+    match = sqlite_match(query)
+    if not match:
+        return queryset.none().annotate(
+            search_rank=Value(0.0, output_field=FloatField()))
+    # Индекс FTS5 присоединяется один раз: bm25 (колонка rank) считается
+    # в том же проходе по совпадениям, без подзапроса на каждую строку.
+    # Сравнение со скрытой колонкой с именем таблицы в FTS5 равносильно
+    # MATCH. bm25 тем меньше, чем лучше совпадение.
+    return queryset.filter(search_index__query=match).annotate(
+        search_rank=-F('search_index__rank'))
@@ -0,0 +1,18 @@
+from jobs.queue import task
+from recipes.images import delete_image_variants, update_image_variants
+from recipes.models import Recipes
+
+
+@task
+def build_recipe_image_variants(recipe_id):
+    """Создаёт уменьшенные копии изображения рецепта."""
+    recipe = Recipes.objects.filter(pk=recipe_id).only(
+        'id', 'image', 'image_variants').first()
+    if recipe is not None and recipe.image:
+        update_image_variants(recipe)
+
+
+@task
+def delete_recipe_image_variants(variants):
+    """Удаляет файлы копий изображения удалённого рецепта."""
+    delete_image_variants(variants)
@@ -0,0 +1,38 @@
+from django.test import TestCase
+
+from recipes.models import Recipes
+from recipes.search import search_recipes
+from users.models import User
+
+
+class RecipeSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass-word-1',
+            first_name='cook', last_name='cook')
+        cls.in_text, cls.in_name, cls.other = (
+            Recipes.objects.create(author=author, name=name, text=text,
+                                   cooking_time=10, image='recipes/x.png')
+            for name, text in (('Суп', 'Густой борщ со сметаной'),
+                               ('Борщ', 'Суп на говядине'),
+                               ('Каша', 'Овсянка на молоке')))
+
+    def search(self, query):
+        return list(search_recipes(Recipes.objects.all(), query).order_by(
+            '-search_rank', '-pub_date', '-id'))
+
+    def test_name_match_ranks_first(self):
+        self.assertEqual(self.search('борщ'), [self.in_name, self.in_text])
+
+    def test_prefix_match_and_all_words_required(self):
+        self.assertEqual(self.search('овс мол'), [self.other])
+        self.assertEqual(self.search('борщ молоке'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.other.name = 'Борщ зелёный'
+        self.other.save()
+        self.assertEqual(self.search('зелён'), [self.other])
+        self.in_name.delete()
+        self.assertEqual(self.search('борщ'), [self.other, self.in_text])
@@ -1,17 +1,31 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
+from recipes.admin_tools import ScalableModelAdmin, input_filter
 from .models import User, Follow
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableModelAdmin):
     """
     Админ-зона подписок.
     """
     list_display = ('user', 'author')
-    list_filter = ('author',)
-    search_fields = ('user',)
+    list_filter = (input_filter('author__username', 'автору'),)
+    list_select_related = ('user', 'author')
+    search_fields = ('^user__username',)
+    autocomplete_fields = ('user', 'author')
 
 
-admin.site.register(User, UserAdmin)
+@admin.register(User)
+class FoodgramUserAdmin(UserAdmin, ScalableModelAdmin):
+    """
+    Админ-зона пользователей со счётчиками рецептов и подписчиков.
+    """
+    list_display = ('username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count', 'is_staff')
+    search_fields = ('^username', '^email')
+    readonly_fields = ('recipes_count', 'followers_count')
+    fieldsets = UserAdmin.fieldsets + (
+        ('Счётчики', {'fields': ('recipes_count', 'followers_count')}),
+    )
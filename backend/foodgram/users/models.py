@@ -23,6 +23,10 @@ class User(AbstractUser):
                             default=USER, verbose_name='Пользовательская роль')
     password = models.CharField(max_length=PASSWORD_MAX_LENGHT,
                                 verbose_name='Пароль')
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов', default=0, editable=False)
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков', default=0, editable=False)
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'password', 'first_name', 'last_name']
 
@@ -0,0 +1,18 @@
+from django.test import TestCase
+
+from users.models import User
+
+
+class UserAdminTests(TestCase):
+
+    def test_change_form_shows_counters(self):
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com',
+            password='pass-word-1', first_name='admin', last_name='admin')
+        User.objects.filter(pk=admin.pk).update(recipes_count=7,
+                                                followers_count=3)
+        self.client.force_login(admin)
+        response = self.client.get(f'/admin/users/user/{admin.pk}/change/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'field-recipes_count')
+        self.assertContains(response, 'field-followers_count')